@@ -7,6 +7,7 @@ from .routes import (
     cart_item,
     category,
     category_item,
+    cdn,
     country,
     coupon,
     currency,
@@ -18,6 +19,7 @@ from .routes import (
     order_refund,
     order_shipment,
     product,
+    product_import,
     product_link,
     product_media,
     product_option,
@@ -0,0 +1,179 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from flask import Response as FlaskResponse
+from flask import abort, request
+from sqlalchemy.orm import Query
+from web.locale import current_locale
+from werkzeug import Response
+from werkzeug.datastructures import Headers
+
+RESPONSE_CACHE_TTL_S = 300
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
+
+class ResponseCache:
+    """LRU cache of rendered GET responses, grouped by the data they contain.
+
+    Entries are keyed by group, endpoint, path and query arguments and locale,
+    see `cached_response`. At most `max_entries` are kept, and expired entries
+    are evicted on `put`. Write handlers invalidate their group, see
+    `invalidates_response`. The TTL bounds staleness for writes made by other
+    processes.
+    """
+
+    def __init__(self, ttl_s: int, max_entries: int) -> None:
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, bytes, str, Headers]] = (
+            OrderedDict()
+        )
+        self._generations: dict[str, int] = {}
+
+    def get(self, key: tuple) -> tuple[bytes, str, Headers] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_s:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return entry[1:]
+
+    def put(self, key: tuple, generation: int, resp: Response) -> str:
+        body = resp.get_data()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        headers = Headers(resp.headers)
+        with self._lock:
+            # Skip responses that were rendered before an invalidation
+            if self._generations.get(key[0], 0) != generation:
+                return etag
+            now = time.monotonic()
+            self._entries[key] = (now, body, etag, headers)
+            self._entries.move_to_end(key)
+            for key_, entry in list(self._entries.items()):
+                if now - entry[0] > self.ttl_s:
+                    del self._entries[key_]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def generation(self, group: str) -> int:
+        with self._lock:
+            return self._generations.get(group, 0)
+
+    def invalidate(self, group: str | None = None) -> None:
+        with self._lock:
+            if group is None:
+                groups = {x[0] for x in self._entries} | self._generations.keys()
+            else:
+                groups = {group}
+            for key in list(self._entries):
+                if key[0] in groups:
+                    del self._entries[key]
+            for group_ in groups:
+                self._generations[group_] = self._generations.get(group_, 0) + 1
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def cached_response(group: str, args: Iterable[str] = ()) -> Callable:
+    """Serve a GET endpoint from `response_cache` with a strong ETag.
+
+    Only the query arguments in `args` are part of the key, so arbitrary
+    query strings can not fill the cache. Requests with other arguments are
+    served by the endpoint without the cache. Requests with a matching
+    `If-None-Match` header are answered with 304.
+    """
+
+    args = frozenset(args)
+
+    def decorator(f: Callable) -> Callable[..., Response]:
+        @functools.wraps(f)
+        def wrap(*args_, **kwargs) -> Response:
+            if not request.args.keys() <= args:
+                return f(*args_, **kwargs)
+            key = (
+                group,
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                current_locale.locale_posix,
+            )
+            entry = response_cache.get(key)
+            if entry is None:
+                generation = response_cache.generation(group)
+                resp = f(*args_, **kwargs)
+                if resp.status_code != 200:
+                    return resp
+                etag = response_cache.put(key, generation, resp)
+                body, headers = resp.get_data(), Headers(resp.headers)
+            else:
+                body, etag, headers = entry
+
+            if etag in request.if_none_match:
+                resp = FlaskResponse(status=304)
+            else:
+                resp = FlaskResponse(body, headers=Headers(headers))
+            resp.set_etag(etag)
+            return resp
+
+        return wrap
+
+    return decorator
+
+
+def invalidates_response(group: str) -> Callable:
+    """Invalidate a group of `response_cache` after a write endpoint."""
+
+    def decorator(f: Callable) -> Callable[..., Response]:
+        @functools.wraps(f)
+        def wrap(*args, **kwargs) -> Response:
+            resp = f(*args, **kwargs)
+            response_cache.invalidate(group)
+            return resp
+
+        return wrap
+
+    return decorator
+
+
+def gen_weak_etag(*parts: object) -> str:
+    value = ":".join(str(x) for x in parts)
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def check_etag(query: Query, *parts: object, vary: Iterable[str] = ()) -> str | None:
+    """Generate a weak ETag from the row versions selected by `query`.
+
+    Extra `parts` the representation depends on, like the locale, are added
+    to the ETag, and the request headers they come from are listed in `vary`.
+    Aborts with 304 when the request already holds the ETag, so neither the
+    resource nor its relationships are loaded. Returns None when `query`
+    finds no row, leaving the not found response to the endpoint.
+    """
+
+    row = query.first()
+    if row is None:
+        return None
+    etag = gen_weak_etag(*row, *parts)
+    if request.if_none_match.contains_weak(etag):
+        resp = FlaskResponse(status=304)
+        resp.set_etag(etag, weak=True)
+        resp.vary.update(vary)
+        abort(resp)
+    return etag
+
+
+def set_etag(resp: Response, etag: str | None, vary: Iterable[str] = ()) -> Response:
+    if etag is not None and resp.status_code == 200:
+        resp.set_etag(etag, weak=True)
+        resp.vary.update(vary)
+    return resp
@@ -0,0 +1,378 @@
+import ftplib
+import io
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
+from typing import Iterable, Sequence
+
+from flask import copy_current_request_context, current_app
+from PIL import Image, ImageOps
+from sqlalchemy import Row, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from web import cdn
+from web.database import conn
+from web.database.model import File, FileTypeId
+from web.i18n import _
+from web.logger import log
+from web.setup import config
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from bp_api.models import CdnDeletion, FileDerivative
+from bp_common.queue import TableQueue
+
+MEDIA_UPLOAD_WORKERS = 8
+MEDIA_IMAGE_QUALITY = 80
+
+
+class Text(StrEnum):
+    FILENAME_MISSING = _("API_MEDIA_FILENAME_MISSING")
+    EXTENSION_UNSUPPORTED = _("API_MEDIA_EXTENSION_UNSUPPORTED")
+    UPLOAD_FAILED = _("API_MEDIA_UPLOAD_FAILED")
+
+
+@dataclass
+class MediaUpload:
+    filename: str | None
+    request_file: FileStorage
+    path: str | None = None
+    type_id: FileTypeId | None = None
+    error: str | None = None
+    derivatives: list[FileDerivative] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "filename": self.filename,
+            "path": self.path,
+            "is_uploaded": self.error is None,
+            "error": self.error,
+            "srcset": gen_srcsets(self.derivatives),
+        }
+
+
+def gen_media_uploads(
+    request_files: list[FileStorage],
+    folder: str,
+    slug: str,
+    sequence: int,
+) -> list[MediaUpload]:
+    """Generate the CDN path and file type of every uploaded file.
+
+    The sequence is read before the files are uploaded outside of the
+    transaction, so concurrent uploads can get the same sequence. A random
+    token in every filename keeps their paths apart.
+    """
+    uploads = []
+    for request_file in request_files:
+        # Increment sequence
+        sequence += 1
+        upload = MediaUpload(request_file.filename, request_file)
+        uploads.append(upload)
+
+        # Create details
+        if request_file.filename is None:
+            upload.error = Text.FILENAME_MISSING
+            continue
+        name, extension = os.path.splitext(request_file.filename)
+        token = secrets.token_hex(4)
+        if config.CDN_AUTO_NAMING:
+            name = f"{slug}-{token}-{sequence}"
+        else:
+            name = f"{secure_filename(name)}-{token}"
+        extension = extension.lstrip(".").lower()
+        filename = f"{name}.{extension}"
+
+        # Get media type
+        if extension in config.CDN_IMAGE_EXTS:
+            upload.type_id = FileTypeId.IMAGE
+        elif extension in config.CDN_VIDEO_EXTS:
+            upload.type_id = FileTypeId.VIDEO
+        else:
+            upload.error = Text.EXTENSION_UNSUPPORTED
+            continue
+        upload.path = os.path.join(folder, slug, filename)
+    return uploads
+
+
+def upload_media(uploads: list[MediaUpload]) -> None:
+    """Upload files and their derivatives to the CDN and record failures.
+
+    Derivatives of images are rendered in a process pool while the originals
+    are uploaded on a thread pool. Must be called outside of a transaction,
+    so no locks are held while the files are transferred.
+    """
+
+    def upload_original(upload: MediaUpload) -> None:
+        try:
+            cdn.upload(upload.request_file, upload.path)
+        except Exception:
+            log.error("Uploading %s failed", upload.path, exc_info=True)
+            upload.error = Text.UPLOAD_FAILED
+
+    def upload_derivative(
+        upload: MediaUpload, derivative: FileDerivative, data: bytes
+    ) -> None:
+        try:
+            cdn.upload(FileStorage(io.BytesIO(data), derivative.path), derivative.path)
+        except Exception:
+            log.error("Uploading %s failed", derivative.path, exc_info=True)
+        else:
+            upload.derivatives.append(derivative)
+
+    pending = [x for x in uploads if x.error is None]
+    if not pending:
+        return
+
+    # Render derivatives of images
+    renders: list[tuple[MediaUpload, str, Future]] = []
+    sizes = getattr(config, "CDN_IMAGE_SIZES", [])
+    formats = getattr(config, "CDN_IMAGE_FORMATS", [])
+    if sizes and formats:
+        for upload in pending:
+            if upload.type_id != FileTypeId.IMAGE or upload.path is None:
+                continue
+            data = upload.request_file.stream.read()
+            upload.request_file.stream.seek(0)
+            future = get_image_executor().submit(
+                render_derivatives, data, sizes, formats
+            )
+            renders.append((upload, upload.path, future))
+
+    workers = min(MEDIA_UPLOAD_WORKERS, len(pending))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(copy_current_request_context(upload_original), x)
+            for x in pending
+        ]
+        for upload, path, future in renders:
+            try:
+                rendered = future.result()
+            except Exception:
+                log.error("Rendering %s failed", upload.path, exc_info=True)
+                continue
+            for width, format_, data in rendered:
+                derivative = FileDerivative(
+                    path=gen_derivative_path(path, width, format_),
+                    width=width,
+                    format=format_,
+                )
+                futures.append(
+                    executor.submit(
+                        copy_current_request_context(upload_derivative),
+                        upload,
+                        derivative,
+                        data,
+                    )
+                )
+    for future in futures:
+        future.result()
+
+
+def insert_media_files(s: Session, uploads: list[MediaUpload]) -> list[File]:
+    """Insert the files and derivatives of all successful uploads."""
+    uploads = [x for x in uploads if x.error is None]
+    files = [File(path=x.path, type_id=x.type_id) for x in uploads]
+    s.add_all(files)
+    s.flush()
+    for upload, file_ in zip(uploads, files):
+        for derivative in upload.derivatives:
+            derivative.file_id = file_.id
+        s.add_all(upload.derivatives)
+    return files
+
+
+def gen_media_resources(s: Session, media: list) -> list[dict]:
+    """Generate resources of product or article media including srcsets."""
+    derivatives: dict[int, list[FileDerivative]] = {}
+    file_ids = [x.file_id for x in media]
+    for derivative in s.query(FileDerivative).filter(
+        FileDerivative.file_id.in_(file_ids)
+    ):
+        derivatives.setdefault(derivative.file_id, []).append(derivative)
+    return [
+        {
+            "id": x.id,
+            "order": x.order,
+            "path": x.file_.path,
+            "description": x.file_.description,
+            "type_id": x.file_.type_id,
+            "srcset": gen_srcsets(derivatives.get(x.file_id, [])),
+        }
+        for x in media
+    ]
+
+
+def gen_derivative_path(path: str, width: int, format_: str) -> str:
+    name, _ = os.path.splitext(path)
+    return f"{name}-{width}w.{format_}"
+
+
+def gen_srcsets(derivatives: list[FileDerivative]) -> dict[str, str]:
+    """Generate a srcset attribute per image format."""
+    base_url = (config.CDN_BASE_URL or "").rstrip("/")
+    srcsets: dict[str, list[str]] = {}
+    for derivative in sorted(derivatives, key=lambda x: x.width):
+        url = f"{base_url}/{derivative.path}"
+        srcsets.setdefault(derivative.format, []).append(f"{url} {derivative.width}w")
+    return {k: ", ".join(v) for k, v in srcsets.items()}
+
+
+_image_executor: ProcessPoolExecutor | None = None
+_image_executor_lock = threading.Lock()
+
+
+def get_image_executor() -> ProcessPoolExecutor:
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is None:
+            # Forking a threaded server is unsafe, so start fresh interpreters
+            _image_executor = ProcessPoolExecutor(
+                max_workers=getattr(config, "CDN_IMAGE_WORKERS", None),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _image_executor
+
+
+def render_derivatives(
+    data: bytes,
+    sizes: list[int],
+    formats: list[str],
+) -> list[tuple[int, str, bytes]]:
+    """Resize an image to every size and encode it in every format.
+
+    Images are never upscaled, sizes above the original width are rendered
+    at the original width instead. Formats that are not supported by the
+    installed Pillow build are skipped.
+    """
+
+    Image.init()
+    formats = [x for x in formats if x.upper() in Image.SAVE]
+    derivatives = []
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        for width in sorted({min(x, image.width) for x in sizes}):
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for format_ in formats:
+                frame = resized
+                if format_.upper() == "JPEG" and frame.mode == "RGBA":
+                    frame = frame.convert("RGB")
+                buffer = io.BytesIO()
+                frame.save(buffer, format=format_.upper(), quality=MEDIA_IMAGE_QUALITY)
+                derivatives.append((width, format_, buffer.getvalue()))
+    return derivatives
+
+
+class CdnDeleteQueue(TableQueue):
+    """Durable queue of CDN paths to delete.
+
+    Paths are recorded with `enqueue` in the transaction that removes their
+    rows, and `dispatch` is called once it is committed. When
+    `CDN_DELETE_QUEUE_ENABLED` is set the workers delete them off the request
+    path, see `TableQueue`. Otherwise they are deleted inline, so rows never
+    pile up without workers.
+    """
+
+    name = "cdn-delete-queue"
+    model = CdnDeletion
+    columns = (CdnDeletion.path,)
+
+    def enqueue(self, s: Session, paths: Iterable[str]) -> None:
+        values = [{"path": x} for x in dict.fromkeys(paths) if x]
+        if not values:
+            return
+        s.execute(
+            insert(CdnDeletion)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=[CdnDeletion.path])
+        )
+
+    def dispatch(self) -> None:
+        if getattr(config, "CDN_DELETE_QUEUE_ENABLED", False):
+            self.start(current_app._get_current_object())  # type: ignore[attr-defined]
+            self.wakeup()
+        else:
+            self.drain()
+
+    def process(self, rows: Sequence[Row]) -> list[bool]:
+        app = current_app._get_current_object()  # type: ignore[attr-defined]
+
+        def delete_path(path: str) -> bool:
+            try:
+                with app.app_context():
+                    cdn.delete(path)
+            except Exception:
+                log.error("Deleting %s from CDN failed", path, exc_info=True)
+                return False
+            return True
+
+        workers = min(MEDIA_UPLOAD_WORKERS, len(rows))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(delete_path, [x.path for x in rows]))
+
+    def reconcile(self, folders: Iterable[str], grace_s: int) -> int:
+        """Enqueue files on the CDN that are not referred to by any row.
+
+        Files modified within `grace_s` are skipped, since uploads are only
+        recorded after they have finished.
+        """
+
+        folders = list(folders)
+        listed = list_cdn_paths(folders, grace_s)
+        with conn.begin() as s:
+            filters = [File.path.startswith(f"{x}/") for x in folders]
+            known = set(s.scalars(select(File.path).where(or_(*filters))))
+            filters = [FileDerivative.path.startswith(f"{x}/") for x in folders]
+            known.update(s.scalars(select(FileDerivative.path).where(or_(*filters))))
+            orphans = [x for x in listed if x not in known]
+            self.enqueue(s, orphans)
+        return len(orphans)
+
+
+cdn_delete_queue = CdnDeleteQueue(
+    workers=1, batch_size=100, interval_s=30, lease_s=300, max_attempts=10
+)
+
+
+def gen_file_paths(s: Session, file_ids: list[int]) -> list[str]:
+    """Get the CDN paths of files and their derivatives."""
+    paths = s.scalars(select(File.path).where(File.id.in_(file_ids))).all()
+    derivative_paths = s.scalars(
+        select(FileDerivative.path).where(FileDerivative.file_id.in_(file_ids))
+    ).all()
+    return [*paths, *derivative_paths]
+
+
+def list_cdn_paths(folders: list[str], grace_s: int) -> list[str]:
+    """List the files under `folders` on the CDN older than `grace_s`."""
+    threshold = datetime.now(timezone.utc) - timedelta(seconds=grace_s)
+    paths = []
+    with ftplib.FTP(
+        config.FTP_HOSTNAME, config.FTP_USERNAME, config.FTP_PASSWORD
+    ) as ftp:
+        stack = list(folders)
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(ftp.mlsd(folder, facts=["type", "modify"]))
+            except ftplib.error_perm:
+                continue
+            for name, facts in entries:
+                path = f"{folder}/{name}"
+                if facts.get("type") == "dir":
+                    stack.append(path)
+                elif facts.get("type") == "file":
+                    modified_at = datetime.strptime(
+                        facts["modify"][:14], "%Y%m%d%H%M%S"
+                    ).replace(tzinfo=timezone.utc)
+                    if modified_at < threshold:
+                        paths.append(path)
+    return paths
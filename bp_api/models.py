@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from sqlalchemy import (
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from web.database.model import Base
+
+
+class FileDerivative(Base):
+    """Resized and re-encoded copies of an image file on the CDN.
+
+    Derivatives are generated on upload and stored next to the original, so
+    a storefront can pick the best fitting one from a srcset.
+    """
+
+    __tablename__ = "file_derivative"
+    __table_args__ = (UniqueConstraint("file_id", "width", "format"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    file_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("file.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    path: Mapped[str] = mapped_column(String(256), nullable=False)
+    width: Mapped[int] = mapped_column(Integer, nullable=False)
+    format: Mapped[str] = mapped_column(String(8), nullable=False)
+
+
+class CdnDeletion(Base):
+    """CDN paths that are waiting to be deleted.
+
+    Rows are inserted in the same transaction that removes the referencing
+    rows, so a path is only deleted from the CDN once that transaction has
+    committed.
+    """
+
+    __tablename__ = "cdn_deletion"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    path: Mapped[str] = mapped_column(String(256), nullable=False, unique=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class SkuName(Base):
+    """Denormalised names of SKUs per locale.
+
+    The name of a SKU is composed from its product and values, which takes
+    several loads per SKU. It is stored here the first time it is listed in a
+    locale, and regenerated when it expires or its SKUs are regenerated.
+    """
+
+    __tablename__ = "sku_name"
+
+    sku_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("sku.id", ondelete="CASCADE"), primary_key=True
+    )
+    locale: Mapped[str] = mapped_column(String(16), primary_key=True)
+    name: Mapped[str] = mapped_column(String(256), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class CartTotals(Base):
+    """Snapshot of the computed totals of a cart.
+
+    The totals are recalculated whenever the items, coupon, VAT or shipment
+    of a cart change, so reading a cart does not walk its relationships.
+    They are also recalculated on read when `version` no longer matches the
+    cart.
+    """
+
+    __tablename__ = "cart_totals"
+
+    cart_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("cart.id", ondelete="CASCADE"), primary_key=True
+    )
+    totals: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    version: Mapped[str] = mapped_column(String(32), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
@@ -0,0 +1,90 @@
+from typing import Iterable
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+from web.database.model import (
+    Cart,
+    CartItem,
+    Product,
+    ProductValue,
+    Sku,
+    SkuDetail,
+)
+
+from bp_api.totals import clear_cart_totals
+from bp_common.deferral import Deferral
+
+
+def defer_sku_unit_prices(
+    s: Session,
+    product_ids: Iterable[int] = (),
+    value_ids: Iterable[int] = (),
+) -> None:
+    """Recalculate SKU unit prices right before the transaction of `s` commits.
+
+    All products and values changed within one transaction are collected,
+    so a bulk repricing results in a single recalculation.
+    """
+    pending = sku_prices.pending(s)
+    pending["product_ids"].update(product_ids)
+    pending["value_ids"].update(value_ids)
+
+
+def set_sku_unit_prices(
+    s: Session,
+    product_ids: Iterable[int] = (),
+    value_ids: Iterable[int] = (),
+) -> int:
+    """Recalculate the unit prices of affected SKUs in one statement.
+
+    A SKU is affected when it belongs to one of `product_ids` or has a detail
+    with one of `value_ids`. Its unit price is the price of the product plus
+    the prices of its values. Only rows whose price changes are written, and
+    their count is returned.
+    """
+
+    product_ids, value_ids = list(product_ids), list(value_ids)
+    filters = []
+    if product_ids:
+        filters.append(Sku.product_id.in_(product_ids))
+    if value_ids:
+        sku_ids = select(SkuDetail.sku_id).where(SkuDetail.value_id.in_(value_ids))
+        filters.append(Sku.id.in_(sku_ids))
+    if not filters:
+        return 0
+
+    values_price = (
+        select(func.coalesce(func.sum(ProductValue.unit_price), 0))
+        .join(SkuDetail, SkuDetail.value_id == ProductValue.id)
+        .where(SkuDetail.sku_id == Sku.id)
+        .scalar_subquery()
+    )
+    unit_price = func.coalesce(Product.unit_price, 0) + values_price
+    sku_ids = s.scalars(
+        update(Sku)
+        .where(
+            Sku.product_id == Product.id,
+            or_(*filters),
+            Sku.unit_price.is_distinct_from(unit_price),
+        )
+        .values(unit_price=unit_price)
+        .returning(Sku.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    # Carts holding these skus are recalculated on their next read
+    if sku_ids:
+        cart_ids = select(CartItem.cart_id).where(CartItem.sku_id.in_(sku_ids))
+        clear_cart_totals(s, Cart.id.in_(cart_ids))
+    return len(sku_ids)
+
+
+def flush_sku_unit_prices(s: Session, pending: dict[str, set[int]]) -> None:
+    set_sku_unit_prices(s, pending["product_ids"], pending["value_ids"])
+
+
+sku_prices: Deferral[dict[str, set[int]]] = Deferral(
+    "sku_prices",
+    lambda: {"product_ids": set(), "value_ids": set()},
+    flush_sku_unit_prices,
+)
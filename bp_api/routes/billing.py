@@ -7,8 +7,9 @@ from web.database.model import Billing, Cart, Order
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import check_etag, set_etag
 
-from .cart import set_shipment, set_vat
+from .cart import set_carts_vat_shipment
 
 #
 # Configuration
@@ -88,9 +89,14 @@ def get_billings_id(billing_id: int) -> Response:
     api.validate_request()
     with conn.begin() as s:
         filters = {Billing.user_id == current_user.id}
+        etag = check_etag(
+            s.query(Billing.id, Billing.updated_at).filter(
+                Billing.id == billing_id, *filters
+            )
+        )
         model: Billing = api.get(s, billing_id, *filters)
         resource = api.gen_resource(s, model)
-    return json_response(data=resource)
+    return set_etag(json_response(data=resource), etag)
 
 
 @api_bp.patch("/billings/<int:billing_id>")
@@ -137,10 +143,7 @@ def clear_default(s: Session, data: dict, model: Billing) -> None:
 
 
 def set_cart(s: Session, data: dict, model: Billing) -> None:
-    carts = s.query(Cart).filter_by(billing_id=model.id).all()
-    for cart in carts:
-        set_vat(s, data, cart)
-        set_shipment(s, data, cart)
+    set_carts_vat_shipment(s, Cart.billing_id == model.id)
 
 
 def val_order(s: Session, data: dict, model: Billing) -> None:
@@ -1,25 +1,53 @@
+import functools
+import threading
+import time
+from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Any
+from typing import Any, Callable
 
 from flask import abort
+from sqlalchemy import update
+from sqlalchemy.orm import Query, selectinload
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.util import has_identity
 from web.api import API, HttpText, json_response
-from web.api.utils.cart import get_shipment_methods
 from web.api.utils.vat import get_vat
 from web.auth import current_user
 from web.database import conn
-from web.database.model import Billing, Cart, Coupon, Shipping
+from web.database.model import (
+    Billing,
+    Cart,
+    CartItem,
+    Coupon,
+    Currency,
+    ShipmentMethod,
+    Shipping,
+    Sku,
+)
 from web.locale import current_locale
 from web.utils import none_attrgetter
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import check_etag, set_etag
+from bp_api.models import CartTotals
+from bp_api.totals import (
+    clear_cart_totals,
+    defer_cart_totals,
+    gen_cart_versions,
+    query_cart_versions,
+    set_cart_totals,
+)
+
+from .shipment_method import resolve_shipment_methods, shipment_index
 
 #
 # Configuration
 #
 
+VAT_CACHE_TTL_S = 3600
+CART_ETAG_VARY = ("Accept-Language",)
+
 
 class CartAPI(API):
     model = Cart
@@ -56,6 +84,52 @@ class CartAPI(API):
     }
 
 
+class VatCache:
+    """Memoised `get_vat` results.
+
+    VAT rules only depend on the country, the business flag and the date, so
+    results are kept per day. Country changes invalidate the cache, see
+    `invalidate_vat_cache`. Results older than `ttl_s` are looked up again,
+    which bounds staleness for changes made by other processes.
+    """
+
+    def __init__(self, ttl_s: int) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._results: dict[tuple, tuple[float, Decimal, bool]] = {}
+
+    def get(self, country_code: str, is_business: bool) -> tuple[Decimal, bool]:
+        key = (country_code, is_business, datetime.now(timezone.utc).date())
+        with self._lock:
+            entry = self._results.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_s:
+            return entry[1:]
+        result = get_vat(country_code, is_business)
+        with self._lock:
+            # Drop results of previous days
+            if any(x[2] != key[2] for x in self._results):
+                self._results.clear()
+            self._results[key] = (time.monotonic(), *result)
+        return result
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+
+vat_cache = VatCache(VAT_CACHE_TTL_S)
+
+
+def invalidate_vat_cache(f: Callable) -> Callable[..., Response]:
+    @functools.wraps(f)
+    def wrap(*args, **kwargs) -> Response:
+        resp = f(*args, **kwargs)
+        vat_cache.invalidate()
+        return resp
+
+    return wrap
+
+
 #
 # Endpoints
 #
@@ -76,22 +150,21 @@ def post_carts() -> Response:
 
 @api_bp.get("/carts")
 def get_carts() -> Response:
-    api = CartAPI()
     with conn.begin() as s:
         filters = {Cart.user_id == current_user.id}
-        models: list[Cart] = api.list_(s, *filters, limit=1)
-        resources = api.gen_resources(s, models)
+        resources = get_cart_resources(s, *filters, limit=1)
     return json_response(data=resources)
 
 
 @api_bp.get("/carts/<int:cart_id>")
 def get_carts_id(cart_id: int) -> Response:
-    api = CartAPI()
     with conn.begin() as s:
-        filters = {Cart.user_id == current_user.id}
-        model: Cart = api.get(s, cart_id, *filters)
-        resource = api.gen_resource(s, model)
-    return json_response(data=resource)
+        etag = check_cart_etag(s, cart_id)
+        filters = {Cart.id == cart_id, Cart.user_id == current_user.id}
+        resources = get_cart_resources(s, *filters, limit=1)
+        if not resources:
+            return json_response(404, HttpText.HTTP_404)
+    return set_etag(json_response(data=resources[0]), etag, vary=CART_ETAG_VARY)
 
 
 @api_bp.patch("/carts/<int:cart_id>")
@@ -124,6 +197,48 @@ def delete_carts_id(cart_id: int) -> Response:
 #
 
 
+def query_cart_version(s: Session, cart_id: int) -> Query:
+    filters = {Cart.id == cart_id, Cart.user_id == current_user.id}
+    return query_cart_versions(s, *filters)
+
+
+def check_cart_etag(s: Session, cart_id: int) -> str | None:
+    # Names and prices are rendered in the locale of the request
+    return check_etag(
+        query_cart_version(s, cart_id),
+        current_locale.locale_posix,
+        vary=CART_ETAG_VARY,
+    )
+
+
+def get_cart_resources(s: Session, *filters, limit: int | None = None) -> list[dict]:
+    """Generate cart resources from their stored totals.
+
+    Carts without stored totals, e.g. after a repricing, or whose totals were
+    stored for another version are recalculated and stored.
+    """
+
+    api = CartAPI()
+    carts: list[Cart] = api.list_(s, *filters, limit=limit)
+    if not carts:
+        return []
+    versions = gen_cart_versions(s, carts)
+    rows = s.query(CartTotals.cart_id, CartTotals.totals, CartTotals.version).filter(
+        CartTotals.cart_id.in_(versions)
+    )
+    totals = {x.cart_id: x.totals for x in rows if x.version == versions[x.cart_id]}
+    stale_carts = [x for x in carts if x.id not in totals]
+    for cart in stale_carts:
+        # Reload the cart, so its totals are not older than its version
+        s.expire(cart)
+    totals.update(set_cart_totals(s, stale_carts, versions))
+    columns = [x for x in CartAPI.get_columns if not isinstance(x, str)]
+    return [
+        {**{x.key: getattr(cart, x.key) for x in columns}, **totals[cart.id]}
+        for cart in carts
+    ]
+
+
 def set_user(s: Session, data: dict, model: Cart) -> None:
     model.user_id = current_user.id
 
@@ -131,7 +246,7 @@ def set_user(s: Session, data: dict, model: Cart) -> None:
 def set_vat(s: Session, data: dict, model: Cart) -> None:
     if "billing_id" in data:
         billing_id = data["billing_id"]
-        billing = s.query(Billing).filter_by(id=billing_id).first()
+        billing = s.get(Billing, billing_id) if billing_id is not None else None
     elif model.billing is not None:
         billing = model.billing
     else:
@@ -139,7 +254,7 @@ def set_vat(s: Session, data: dict, model: Cart) -> None:
 
     if "shipping_id" in data:
         shipping_id = data["shipping_id"]
-        shipping = s.query(Shipping).filter_by(id=shipping_id).first()
+        shipping = s.get(Shipping, shipping_id) if shipping_id is not None else None
     elif model.shipping is not None:
         shipping = model.shipping
     else:
@@ -158,13 +273,14 @@ def set_vat(s: Session, data: dict, model: Cart) -> None:
         is_business = False
         currency_id = current_locale.currency.id
 
-    vat_rate, vat_reverse = get_vat(country_code, is_business)
+    vat_rate, vat_reverse = vat_cache.get(country_code, is_business)
     model.currency_id = currency_id
     model.vat_rate = vat_rate
     model.vat_reverse = vat_reverse
     s.flush()
     if has_identity(model):
         s.expire(model)
+    defer_cart_totals(s, model)
 
 
 def set_shipment(s: Session, data: dict, model: Cart) -> None:
@@ -175,7 +291,26 @@ def set_shipment(s: Session, data: dict, model: Cart) -> None:
     else:
         shipment_method_id = None
 
-    shipment_methods = get_shipment_methods(s, model)
+    shipment_methods = resolve_shipment_methods(s, model)
+    shipment_method = select_shipment_method(shipment_methods, shipment_method_id)
+    if shipment_method is not None:
+        model.shipment_method_id = shipment_method.id
+        model.shipment_price = shipment_method.unit_price * model.currency.rate
+    else:
+        model.shipment_method_id = None
+        model.shipment_price = Decimal("0.00")
+
+    s.flush()
+    if has_identity(model):
+        s.expire(model)
+    defer_cart_totals(s, model)
+
+
+def select_shipment_method(
+    shipment_methods: list[ShipmentMethod],
+    shipment_method_id: int | None,
+) -> ShipmentMethod | None:
+    """Keep the chosen shipment method if available, else pick the cheapest."""
     if shipment_method_id is not None:
         shipment_method = next(
             (
@@ -193,17 +328,97 @@ def set_shipment(s: Session, data: dict, model: Cart) -> None:
             shipment_methods,
             key=none_attrgetter("unit_price"),
         )
+    return shipment_method
 
-    if shipment_method is not None:
-        model.shipment_method_id = shipment_method.id
-        model.shipment_price = shipment_method.unit_price * model.currency.rate
-    else:
-        model.shipment_method_id = None
-        model.shipment_price = Decimal("0.00")
 
-    s.flush()
-    if has_identity(model):
-        s.expire(model)
+def set_carts_vat_shipment(s: Session, *filters) -> int:
+    """Batch version of `set_vat` followed by `set_shipment`.
+
+    Carts matching `filters` are grouped by everything their VAT, currency
+    and shipment depend on, and every group is updated with one statement.
+    Their totals are dropped and recalculated the next time they are read.
+    """
+
+    carts = (
+        s.query(Cart)
+        .options(
+            selectinload(Cart.billing).joinedload(Billing.country),
+            selectinload(Cart.shipping).joinedload(Shipping.country),
+            selectinload(Cart.items).joinedload(CartItem.sku).joinedload(Sku.product),
+        )
+        .filter(*filters)
+        .all()
+    )
+
+    groups: dict[tuple, list[int]] = {}
+    for cart in carts:
+        if cart.billing is not None:
+            country_code = cart.billing.country.code
+            is_business = cart.billing.company is not None
+            currency_id = cart.billing.country.currency_id
+        elif cart.shipping is not None:
+            country_code = cart.shipping.country.code
+            is_business = cart.shipping.company is not None
+            currency_id = cart.shipping.country.currency_id
+        else:
+            country_code = current_locale.country.code
+            is_business = False
+            currency_id = current_locale.currency.id
+
+        if cart.shipping is not None:
+            country_id = cart.shipping.country_id
+            region_id = cart.shipping.country.region_id
+        else:
+            country_id = current_locale.country.id
+            region_id = current_locale.country.region_id
+
+        class_ids = frozenset(
+            x.sku.product.shipment_class_id
+            for x in cart.items
+            if x.sku.product.shipment_class_id is not None
+        )
+        key = (
+            country_code,
+            is_business,
+            currency_id,
+            class_ids,
+            country_id,
+            region_id,
+            cart.shipment_method_id,
+        )
+        groups.setdefault(key, []).append(cart.id)
+
+    for key, cart_ids in groups.items():
+        country_code, is_business, currency_id, class_ids, *zone, method_id = key
+        vat_rate, vat_reverse = vat_cache.get(country_code, is_business)
+        shipment_methods = shipment_index.resolve(s, set(class_ids), *zone)
+        shipment_method = select_shipment_method(shipment_methods, method_id)
+        if shipment_method is not None:
+            currency = s.get(Currency, currency_id)
+            shipment_method_id = shipment_method.id
+            shipment_price = shipment_method.unit_price * currency.rate
+        else:
+            shipment_method_id = None
+            shipment_price = Decimal("0.00")
+
+        s.execute(
+            update(Cart)
+            .where(Cart.id.in_(cart_ids))
+            .values(
+                currency_id=currency_id,
+                vat_rate=vat_rate,
+                vat_reverse=vat_reverse,
+                shipment_method_id=shipment_method_id,
+                shipment_price=shipment_price,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    for cart in carts:
+        s.expire(cart)
+    if carts:
+        clear_cart_totals(s, Cart.id.in_([x.id for x in carts]))
+    return len(carts)
 
 
 def set_coupon(s: Session, data: dict, model: Cart) -> None:
@@ -220,3 +435,4 @@ def set_coupon(s: Session, data: dict, model: Cart) -> None:
             else:
                 coupon_id = coupon.id
         model.coupon_id = coupon_id
+        defer_cart_totals(s, model)
@@ -1,17 +1,24 @@
 from enum import StrEnum
 
-from flask import abort
+from flask import abort, g
+from sqlalchemy import false, select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.session import Session
-from web.api import API, HttpText, json_response
-from web.api.utils.cart import get_shipment_methods
+from web.api import API, HttpText, json_get, json_response
 from web.auth import current_user
 from web.database import conn
-from web.database.model import Cart, CartItem, Coupon
+from web.database.model import Cart, CartItem, Coupon, Shipping, Sku
 from web.i18n import _
 from web.utils import none_attrgetter
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import set_etag
+from bp_api.totals import defer_cart_totals
+
+from .cart import CART_ETAG_VARY, check_cart_etag
+from .shipment_method import resolve_shipment_methods
 
 #
 # Configuration
@@ -52,22 +59,54 @@ def post_carts_id_items(cart_id: int) -> Response:
     api = CartItemAPI()
     data = api.gen_data(api.post_columns)
     with conn.begin() as s:
+        authorize_cart(s, data, None)
         model = upsert_cart_item(s, data, None)
         set_cart(s, data, None)
         resource = api.gen_resource(s, model)
     return json_response(message=Text.CART_ITEM_ADDED, data=resource)
 
 
-@api_bp.get("/carts/<int:cart_id>/items")
-def get_carts_id_items(cart_id: int) -> Response:
+@api_bp.post("/carts/<int:cart_id>/items:batch")
+def post_carts_id_items_batch(cart_id: int) -> Response:
     api = CartItemAPI()
     data = api.gen_path_data()
+    data["items"], _ = json_get("items", list, nullable=False)
     with conn.begin() as s:
+        val_cart_items(s, data, None)
         authorize_cart(s, data, None)
+        models = upsert_cart_items(s, data, None)
+        set_cart(s, data, None)
+        resources = api.gen_resources(s, models)
+    return json_response(message=Text.CART_ITEM_ADDED, data=resources)
+
+
+@api_bp.patch("/carts/<int:cart_id>/items:batch")
+def patch_carts_id_items_batch(cart_id: int) -> Response:
+    api = CartItemAPI()
+    data = api.gen_path_data()
+    data["items"], _ = json_get("items", list, nullable=False)
+    with conn.begin() as s:
+        val_cart_items(s, data, None)
+        authorize_cart(s, data, None)
+        models = upsert_cart_items(s, data, None, add=False)
+        set_cart(s, data, None)
+        resources = api.gen_resources(s, models)
+    return json_response(data=resources)
+
+
+@api_bp.get("/carts/<int:cart_id>/items")
+def get_carts_id_items(cart_id: int) -> Response:
+    api = CartItemAPI()
+    with conn.begin() as s:
+        # The version query is scoped to the user, so it doubles as the
+        # ownership check without loading the cart and its items
+        etag = check_cart_etag(s, cart_id)
+        if etag is None:
+            return json_response(404, HttpText.HTTP_404)
         filters = {CartItem.cart_id == cart_id}
         models: list[CartItem] = api.list_(s, *filters)
         resources = api.gen_resources(s, models)
-    return json_response(data=resources)
+    return set_etag(json_response(data=resources), etag, vary=CART_ETAG_VARY)
 
 
 @api_bp.patch("/carts/<int:cart_id>/items/<int:cart_item_id>")
@@ -76,7 +115,7 @@ def patch_cart_id_items_id(cart_id: int, cart_item_id: int) -> Response:
     data = api.gen_data(api.patch_columns)
     with conn.begin() as s:
         authorize_cart(s, data, None)
-        model: CartItem = api.get(s, cart_item_id)
+        model = get_cart_item(s, data, None)
         val_cart_item(s, data, model)
         api.update(s, data, model)
         set_cart(s, data, None)
@@ -90,8 +129,9 @@ def delete_cart_id_items_id(cart_id: int, cart_item_id: int) -> Response:
     data = api.gen_path_data()
     with conn.begin() as s:
         authorize_cart(s, data, None)
-        model: CartItem = api.get(s, cart_item_id)
+        model = get_cart_item(s, data, None)
         api.delete(s, model)
+        remove_cart_item(s, data, model)
         set_cart(s, data, None)
     return json_response()
 
@@ -101,47 +141,109 @@ def delete_cart_id_items_id(cart_id: int, cart_item_id: int) -> Response:
 #
 
 
-def upsert_cart_item(s: Session, data: dict, model: None) -> CartItem:
+def authorize_cart(s: Session, data: dict, model: None) -> Cart:
     cart_id = data["cart_id"]
+    filters = {Cart.id == cart_id, Cart.user_id == current_user.id}
+    cart = (
+        s.query(Cart)
+        .options(
+            joinedload(Cart.currency),
+            joinedload(Cart.items),
+            joinedload(Cart.items, CartItem.sku),
+            joinedload(Cart.items, CartItem.sku, Sku.product),
+            joinedload(Cart.shipping),
+            joinedload(Cart.shipping, Shipping.country),
+        )
+        .filter(*filters)
+        .first()
+    )
+    if cart is None:
+        abort(json_response(404, HttpText.HTTP_404))
+    g.cart = cart
+    return cart
+
+
+def get_cart_item(s: Session, data: dict, model: None) -> CartItem:
+    cart = g.cart
+    cart_item_id = data["cart_item_id"]
+    cart_item = next((x for x in cart.items if x.id == cart_item_id), None)
+    if cart_item is None:
+        abort(json_response(404, HttpText.HTTP_404))
+    return cart_item
+
+
+def upsert_cart_item(s: Session, data: dict, model: None) -> CartItem:
+    cart = g.cart
     sku_id = data["sku_id"]
     quantity = data.get("quantity", 1)
 
-    filters = {Cart.user_id == current_user.id, Cart.id == cart_id}
-    cart = s.query(Cart).filter(*filters).first()
-    if cart is None:
-        abort(json_response(404, HttpText.HTTP_404))
+    for cart_item in cart.items:
+        if cart_item.sku_id == sku_id:
+            cart_item.quantity += quantity
+            break
     else:
-        for cart_item in cart.items:
-            if cart_item.sku_id == sku_id:
-                cart_item.quantity += quantity
-                break
-        else:
+        cart_item = CartItem(cart_id=cart.id, sku_id=sku_id, quantity=quantity)
+        cart.items.append(cart_item)
+
+    s.flush()
+    return cart_item
+
+
+def upsert_cart_items(
+    s: Session, data: dict, model: None, add: bool = True
+) -> list[CartItem]:
+    """Add the quantities of `data["items"]` to the cart, or set them.
+
+    When `add` is True quantities are added to existing items, so an SKU that
+    occurs more than once in the payload gets the sum of its quantities.
+    Otherwise quantities replace existing ones and the last occurrence wins.
+    """
+
+    cart = g.cart
+    cart_items = {x.sku_id: x for x in cart.items}
+
+    for item in data["items"]:
+        sku_id = item["sku_id"]
+        quantity = item.get("quantity", 1)
+        if sku_id not in cart_items:
             cart_item = CartItem(cart_id=cart.id, sku_id=sku_id, quantity=quantity)
             cart.items.append(cart_item)
+            cart_items[sku_id] = cart_item
+        elif add:
+            cart_items[sku_id].quantity += quantity
+        else:
+            cart_items[sku_id].quantity = quantity
 
+    # All inserts and updates are batched into a single flush
     s.flush()
-    return cart_item
+    sku_ids = dict.fromkeys(x["sku_id"] for x in data["items"])
+    return [cart_items[x] for x in sku_ids]
+
+
+def remove_cart_item(s: Session, data: dict, model: CartItem) -> None:
+    # The row is already deleted, so only the loaded collection is updated to
+    # keep the recompute free of another cart load.
+    cart = g.cart
+    items = [x for x in cart.items if x is not model]
+    set_committed_value(cart, "items", items)
 
 
 def set_cart(s: Session, data: dict, model: None) -> None:
-    cart_id = data["cart_id"]
-    cart = s.query(Cart).filter(Cart.id == cart_id).first()
-    if cart is not None:
-        if cart.coupon_id is None:
-            coupon = (
-                s.query(Coupon).filter_by(is_default=True, is_deleted=False).first()
-            )
-            if coupon is not None:
-                cart.coupon_id = coupon.id
-        shipment_methods = get_shipment_methods(s, cart)
-        if shipment_methods:
-            shipment_method = min(shipment_methods, key=none_attrgetter("unit_price"))
-            cart.shipment_method_id = shipment_method.id
-            cart.shipment_price = shipment_method.unit_price * cart.currency.rate
-        else:
-            cart.shipment_method_id = None
-            cart.shipment_price = 0
-        s.flush()
+    cart = g.cart
+    if cart.coupon_id is None:
+        coupon = s.query(Coupon).filter_by(is_default=True, is_deleted=False).first()
+        if coupon is not None:
+            cart.coupon_id = coupon.id
+    shipment_methods = resolve_shipment_methods(s, cart)
+    if shipment_methods:
+        shipment_method = min(shipment_methods, key=none_attrgetter("unit_price"))
+        cart.shipment_method_id = shipment_method.id
+        cart.shipment_price = shipment_method.unit_price * cart.currency.rate
+    else:
+        cart.shipment_method_id = None
+        cart.shipment_price = 0
+    s.flush()
+    defer_cart_totals(s, cart)
 
 
 def val_cart_item(s: Session, data: dict, model: CartItem) -> None:
@@ -149,11 +251,25 @@ def val_cart_item(s: Session, data: dict, model: CartItem) -> None:
         abort(json_response(400, Text.CART_ITEM_QUANTITY_ZERO))
 
 
-def authorize_cart(s: Session, data: dict, model: None) -> Cart:
-    cart_id = data["cart_id"]
-    filters = {Cart.id == cart_id, Cart.user_id == current_user.id}
-    cart = s.query(Cart).filter(*filters).first()
-    if cart is None:
+def val_cart_items(s: Session, data: dict, model: None) -> None:
+    if not data["items"]:
+        abort(json_response(400, HttpText.HTTP_400))
+    for item in data["items"]:
+        if not isinstance(item, dict):
+            abort(json_response(400, HttpText.HTTP_400))
+        sku_id = item.get("sku_id")
+        quantity = item.get("quantity", 1)
+        if not isinstance(sku_id, int) or not isinstance(quantity, int):
+            abort(json_response(400, HttpText.HTTP_400))
+        if isinstance(sku_id, bool) or isinstance(quantity, bool):
+            abort(json_response(400, HttpText.HTTP_400))
+        if quantity <= 0:
+            abort(json_response(400, Text.CART_ITEM_QUANTITY_ZERO))
+
+    # Check skus, so unknown ids do not fail on the foreign key
+    sku_ids = {x["sku_id"] for x in data["items"]}
+    found_ids = set(
+        s.scalars(select(Sku.id).where(Sku.id.in_(sku_ids), Sku.is_deleted == false()))
+    )
+    if found_ids != sku_ids:
         abort(json_response(404, HttpText.HTTP_404))
-    else:
-        return cart
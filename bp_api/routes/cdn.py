@@ -0,0 +1,86 @@
+from sqlalchemy import true
+from sqlalchemy.orm import Session
+from web.api import json_response
+from web.auth import authorize
+from web.database import conn
+from web.database.model import (
+    File,
+    Product,
+    ProductMedia,
+    ProductValue,
+    UserRoleLevel,
+)
+from web.setup import config
+from werkzeug import Response
+
+from bp_api import api_bp
+from bp_api.media import cdn_delete_queue, gen_file_paths
+
+#
+# Configuration
+#
+
+CDN_MEDIA_FOLDERS = ["product", "article"]
+CDN_RECONCILE_GRACE_S = 3600
+
+
+@api_bp.record_once
+def start_cdn_delete_queue(state) -> None:
+    if getattr(config, "CDN_DELETE_QUEUE_ENABLED", False):
+        cdn_delete_queue.start(state.app)
+
+
+#
+# Endpoints
+#
+
+
+@api_bp.post("/cdn/reconcile")
+@authorize(UserRoleLevel.ADMIN)
+def post_cdn_reconcile() -> Response:
+    count = cdn_delete_queue.reconcile(CDN_MEDIA_FOLDERS, CDN_RECONCILE_GRACE_S)
+    cdn_delete_queue.dispatch()
+    return json_response(data={"orphans_count": count})
+
+
+@api_bp.post("/cdn/purge")
+@authorize(UserRoleLevel.ADMIN)
+def post_cdn_purge() -> Response:
+    with conn.begin() as s:
+        media_count = purge_product_media(s)
+    cdn_delete_queue.dispatch()
+    return json_response(data={"media_count": media_count})
+
+
+#
+# Functions
+#
+
+
+def purge_product_media(s: Session) -> int:
+    """Remove the media of deleted products and queue their files on the CDN.
+
+    Deleting a product keeps its media, so the delete can be undone. Values
+    referring to the media are detached first.
+    """
+
+    product_media = (
+        s.query(ProductMedia)
+        .join(Product, Product.id == ProductMedia.product_id)
+        .filter(Product.is_deleted == true())
+        .all()
+    )
+    if not product_media:
+        return 0
+
+    media_ids = [x.id for x in product_media]
+    file_ids = [x.file_id for x in product_media]
+    s.query(ProductValue).filter(ProductValue.media_id.in_(media_ids)).update(
+        {ProductValue.media_id: None}, synchronize_session=False
+    )
+    cdn_delete_queue.enqueue(s, gen_file_paths(s, file_ids))
+    for x in product_media:
+        s.delete(x)
+    s.flush()
+    s.query(File).filter(File.id.in_(file_ids)).delete(synchronize_session=False)
+    return len(product_media)
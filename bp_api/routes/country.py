@@ -5,6 +5,9 @@ from web.database.model import Country, UserRoleLevel
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import cached_response, invalidates_response
+
+from .cart import invalidate_vat_cache
 
 #
 # Configuration
@@ -44,6 +47,8 @@ class CountryAPI(API):
 
 @api_bp.post("/countries")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("countries")
+@invalidate_vat_cache
 def post_countries() -> Response:
     api = CountryAPI()
     data = api.gen_data(api.post_columns)
@@ -55,6 +60,7 @@ def post_countries() -> Response:
 
 
 @api_bp.get("/countries")
+@cached_response("countries")
 def get_countries() -> Response:
     api = CountryAPI()
     with conn.begin() as s:
@@ -64,6 +70,7 @@ def get_countries() -> Response:
 
 
 @api_bp.get("/countries/<int:country_id>")
+@cached_response("countries")
 def get_countries_id(country_id: int) -> Response:
     api = CountryAPI()
     with conn.begin() as s:
@@ -74,6 +81,8 @@ def get_countries_id(country_id: int) -> Response:
 
 @api_bp.patch("/countries/<int:country_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("countries")
+@invalidate_vat_cache
 def patch_countries_id(country_id: int) -> Response:
     api = CountryAPI()
     data = api.gen_data(api.patch_columns)
@@ -86,6 +95,8 @@ def patch_countries_id(country_id: int) -> Response:
 
 @api_bp.delete("/countries/<int:country_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("countries")
+@invalidate_vat_cache
 def delete_countries_id(country_id: int) -> Response:
     api = CountryAPI()
     with conn.begin() as s:
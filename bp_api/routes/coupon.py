@@ -3,10 +3,11 @@ from decimal import Decimal
 from web.api import HttpText, json_get, json_response
 from web.auth import authorize
 from web.database import conn
-from web.database.model import Coupon, UserRoleLevel
+from web.database.model import Cart, Coupon, UserRoleLevel
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.totals import clear_cart_totals
 
 #
 # Configuration
@@ -49,6 +50,9 @@ def delete_coupons_id(coupon_id: int) -> Response:
             return json_response(404, HttpText.HTTP_404)
         coupon.is_deleted = True
 
+        # Drop totals of carts with this coupon
+        clear_cart_totals(s, Cart.coupon_id == coupon_id)
+
     return json_response()
 
 
@@ -5,6 +5,7 @@ from web.database.model import Currency, UserRoleLevel
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import cached_response, invalidates_response
 
 #
 # Configuration
@@ -33,6 +34,7 @@ class CurrencyAPI(API):
 
 @api_bp.post("/currencies")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("currencies")
 def post_currencies() -> Response:
     api = CurrencyAPI()
     data = api.gen_data(api.post_columns)
@@ -44,6 +46,7 @@ def post_currencies() -> Response:
 
 
 @api_bp.get("/currencies")
+@cached_response("currencies")
 def get_currencies() -> Response:
     api = CurrencyAPI()
     with conn.begin() as s:
@@ -53,6 +56,7 @@ def get_currencies() -> Response:
 
 
 @api_bp.get("/currencies/<int:currency_id>")
+@cached_response("currencies")
 def get_currencies_id(currency_id: int) -> Response:
     api = CurrencyAPI()
     with conn.begin() as s:
@@ -63,6 +67,7 @@ def get_currencies_id(currency_id: int) -> Response:
 
 @api_bp.delete("/currencies/<int:currency_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("currencies")
 def delete_currencies_id(currency_id: int) -> Response:
     api = CurrencyAPI()
     with conn.begin() as s:
@@ -5,6 +5,7 @@ from web.database.model import Language, UserRoleLevel
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import cached_response, invalidates_response
 
 #
 # Configuration
@@ -32,6 +33,7 @@ class LanguageAPI(API):
 
 @api_bp.post("/languages")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("languages")
 def post_languages() -> Response:
     api = LanguageAPI()
     data = api.gen_data(api.post_columns)
@@ -43,6 +45,7 @@ def post_languages() -> Response:
 
 
 @api_bp.get("/languages")
+@cached_response("languages")
 def get_languages() -> Response:
     api = LanguageAPI()
     with conn.begin() as s:
@@ -52,6 +55,7 @@ def get_languages() -> Response:
 
 
 @api_bp.get("/languages/<int:language_id>")
+@cached_response("languages")
 def get_languages_id(language_id: int) -> Response:
     api = LanguageAPI()
     with conn.begin() as s:
@@ -62,6 +66,7 @@ def get_languages_id(language_id: int) -> Response:
 
 @api_bp.delete("/languages/<int:language_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("languages")
 def delete_languages_id(language_id: int) -> Response:
     api = LanguageAPI()
     with conn.begin() as s:
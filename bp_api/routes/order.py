@@ -4,7 +4,6 @@ from flask import abort, g
 from pyvat import is_vat_number_format_valid
 from sqlalchemy.orm.session import Session
 from web.api import API, HttpText, json_response
-from web.api.utils.cart import get_shipment_methods
 from web.api.utils.mollie import Mollie
 from web.auth import authorize, current_user
 from web.database import conn
@@ -20,11 +19,13 @@ from web.database.model import (
 )
 from web.database.utils import copy_row
 from web.i18n import _
-from web.mail import mail
 from web.mail.enum import MailEvent
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_common.outbox import defer_mail_events
+
+from .shipment_method import resolve_shipment_methods
 
 #
 # Configuration
@@ -126,7 +127,7 @@ def val_status(s: Session, data: dict, model: Order) -> None:
 def val_cart(s: Session, data: dict, model: Order) -> None:
     cart = g.cart
     # Check shipment method
-    shipment_methods = get_shipment_methods(s, cart)
+    shipment_methods = resolve_shipment_methods(s, cart)
     if shipment_methods:
         if cart.shipment_method_id is None:
             abort(json_response(400, Text.SHIPMENT_METHOD_REQUIRED))
@@ -203,7 +204,7 @@ def set_order_lines(s: Session, data: dict, model: Order) -> None:
 
 def mail_order(s: Session, data: dict, model: Order) -> None:
     if data.get("trigger_mail", True):
-        mail.trigger_events(
+        defer_mail_events(
             s,
             MailEvent.ORDER_RECEIVED,
             model.user_id,
@@ -1,15 +1,37 @@
-from flask import send_file
+import io
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from typing import Callable, Iterator
+
+from flask import copy_current_request_context, request, send_file, stream_with_context
 from web.api import HttpText, json_response
 from web.auth import authorize
 from web.database import conn
-from web.database.model import Order, UserRoleLevel
+from web.database.model import Invoice, Order, Refund, UserRoleLevel
 from web.document import get_pdf_path
 from web.document.object import gen_invoice_pdf
 from web.i18n import _
+from web.locale import current_locale
+from web.logger import log
 from web.utils import remove_file
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_common.document import (
+    cache_invoice_pdf,
+    cache_refund_pdf,
+    gen_invoice_etag,
+    gen_refund_etag,
+)
+
+#
+# Configuration
+#
+
+
+PDF_EXPORT_WORKERS = 4
+
 
 #
 # Endpoints
@@ -24,9 +46,143 @@ def get_orders_id_invoices_id_pdf(order_id: int, invoice_id: int) -> Response:
         if not order or not order.invoice or order.invoice.id != invoice_id:
             return json_response(404, HttpText.HTTP_404)
         invoice = order.invoice
-        pdf = gen_invoice_pdf(s, order, invoice)
         pdf_name = _("PDF_INVOICE_FILENAME", invoice_number=invoice.number)
+
+        # Serve paid invoices from the cache
+        etag = gen_invoice_etag(invoice, current_locale.locale_posix)
+        if etag is not None:
+            if request.if_none_match.contains(etag):
+                resp = Response(status=304)
+                resp.set_etag(etag)
+                return resp
+            pdf_path = cache_invoice_pdf(s, order, invoice, etag)
+            return send_file(
+                pdf_path, as_attachment=True, download_name=pdf_name, etag=etag
+            )
+
+        pdf = gen_invoice_pdf(s, order, invoice)
         pdf_path = get_pdf_path(pdf_name)
         pdf.output(pdf_path)
     remove_file(pdf_path, delay_s=20)
     return send_file(pdf_path, as_attachment=True, download_name=pdf_name)
+
+
+@api_bp.get("/orders/documents/zip")
+@authorize(UserRoleLevel.ADMIN)
+def get_orders_documents_zip() -> Response:
+    start_date = request.args.get("start_date", type=date.fromisoformat)
+    end_date = request.args.get("end_date", type=date.fromisoformat)
+    if start_date is None or end_date is None or start_date > end_date:
+        return json_response(400, HttpText.HTTP_400)
+
+    with conn.begin() as s:
+        # Get paid invoices and refunds within the date range
+        end_date += timedelta(days=1)
+        invoice_ids = (
+            s.query(Invoice.id)
+            .filter(Invoice.paid_at >= start_date, Invoice.paid_at < end_date)
+            .order_by(Invoice.id)
+            .all()
+        )
+        refund_ids = (
+            s.query(Refund.id)
+            .filter(Refund.created_at >= start_date, Refund.created_at < end_date)
+            .order_by(Refund.id)
+            .all()
+        )
+    tasks: list[tuple[Callable[[int], tuple[str, str]], int]] = [
+        (render_invoice, x.id) for x in invoice_ids
+    ]
+    tasks += [(render_refund, x.id) for x in refund_ids]
+
+    resp = Response(stream_with_context(gen_zip(tasks)), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = "attachment; filename=documents.zip"
+    return resp
+
+
+#
+# Functions
+#
+
+
+class ZipBuffer(io.RawIOBase):
+    """Unseekable buffer that collects the bytes written by `zipfile`."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self) -> bytes:
+        value = b"".join(self._chunks)
+        self._chunks.clear()
+        return value
+
+
+def gen_zip(tasks: list) -> Iterator[bytes]:
+    """Render documents on a thread pool and stream them into a ZIP file.
+
+    At most twice the number of workers is rendered ahead of the stream, and
+    every document is yielded as soon as it is written to the archive. The
+    response has already started by then, so documents that fail to render
+    are listed in an `errors.txt` entry instead of aborting the archive.
+    """
+    buffer = ZipBuffer()
+    pending: dict[Future, tuple[Callable, int]] = {}
+    errors: list[str] = []
+    with (
+        ThreadPoolExecutor(max_workers=PDF_EXPORT_WORKERS) as executor,
+        zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as zip_,
+    ):
+        tasks_iter = iter(tasks)
+        while True:
+            for func, id_ in tasks_iter:
+                future = executor.submit(copy_current_request_context(func), id_)
+                pending[future] = (func, id_)
+                if len(pending) >= PDF_EXPORT_WORKERS * 2:
+                    break
+            if not pending:
+                break
+            done = wait(pending, return_when=FIRST_COMPLETED).done
+            for future in done:
+                func, id_ = pending.pop(future)
+                try:
+                    name, path = future.result()
+                    zip_.write(path, arcname=name)
+                except Exception as error:
+                    log.error(
+                        "Exporting %s %d failed", func.__name__, id_, exc_info=True
+                    )
+                    errors.append(f"{func.__name__} {id_}: {error!r}")
+                    continue
+                yield buffer.pop()
+        if errors:
+            zip_.writestr("errors.txt", "\n".join(errors) + "\n")
+    yield buffer.pop()
+
+
+def render_invoice(invoice_id: int) -> tuple[str, str]:
+    with conn.begin() as s:
+        invoice = s.query(Invoice).filter_by(id=invoice_id).one()
+        order = s.query(Order).filter_by(id=invoice.order_id).one()
+        name = _("PDF_INVOICE_FILENAME", invoice_number=invoice.number)
+        etag = gen_invoice_etag(invoice, current_locale.locale_posix)
+        if etag is None:
+            raise ValueError(f"Invoice {invoice_id} is not paid")
+        path = cache_invoice_pdf(s, order, invoice, etag)
+    return name, path
+
+
+def render_refund(refund_id: int) -> tuple[str, str]:
+    with conn.begin() as s:
+        refund = s.query(Refund).filter_by(id=refund_id).one()
+        order = s.query(Order).filter_by(id=refund.order_id).one()
+        name = _("PDF_REFUND_FILENAME", refund_number=refund.number)
+        etag = gen_refund_etag(refund, current_locale.locale_posix)
+        path = cache_refund_pdf(s, order, order.invoice, refund, etag)
+    return name, path
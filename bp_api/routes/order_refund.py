@@ -1,21 +1,20 @@
 from decimal import Decimal
 from enum import StrEnum
 
-from flask import send_file
+from flask import request, send_file
 from web.api import HttpText, json_get, json_response
 from web.api.utils.mollie import Mollie
 from web.auth import authorize
 from web.database import conn
 from web.database.model import Order, Refund, UserRoleLevel
-from web.document import get_pdf_path
-from web.document.object import gen_refund_pdf
 from web.i18n import _
-from web.mail import mail
+from web.locale import current_locale
 from web.mail.enum import MailEvent
-from web.utils import remove_file
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_common.document import cache_refund_pdf, gen_refund_etag
+from bp_common.outbox import defer_mail_events
 
 #
 # Configuration
@@ -77,7 +76,7 @@ def post_orders_id_refund(order_id: int) -> Response:
         s.flush()
 
         # Send email
-        mail.trigger_events(
+        defer_mail_events(
             s,
             MailEvent.ORDER_REFUNDED,
             order.user_id,
@@ -98,12 +97,16 @@ def get_orders_id_refunds_id_pdf(order_id: int, refund_id: int) -> Response:
         if not order or not order.invoice or not refund or refund.order_id != order_id:
             return json_response(404, HttpText.HTTP_404)
         invoice = order.invoice
-        pdf = gen_refund_pdf(s, order, invoice, refund)
         pdf_name = _("PDF_REFUND_FILENAME", refund_number=refund.number)
-        pdf_path = get_pdf_path(pdf_name)
-        pdf.output(pdf_path)
-    remove_file(pdf_path, delay_s=20)
-    return send_file(pdf_path, as_attachment=True, download_name=pdf_name)
+
+        # Serve refunds from the cache
+        etag = gen_refund_etag(refund, current_locale.locale_posix)
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            return resp
+        pdf_path = cache_refund_pdf(s, order, invoice, refund, etag)
+    return send_file(pdf_path, as_attachment=True, download_name=pdf_name, etag=etag)
 
 
 #
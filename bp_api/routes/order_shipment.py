@@ -3,10 +3,10 @@ from web.auth import authorize
 from web.database import conn
 from web.database.model import Order, OrderStatusId, Shipment, UserRoleLevel
 from web.mail.enum import MailEvent
-from web.mail.mail import mail
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_common.outbox import defer_mail_events
 
 #
 # Configuration
@@ -39,7 +39,7 @@ def post_orders_id_shipments(order_id: int) -> Response:
         s.flush()
 
         # Send email
-        mail.trigger_events(
+        defer_mail_events(
             s,
             MailEvent.ORDER_SHIPPED,
             order.user_id,
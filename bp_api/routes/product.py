@@ -1,14 +1,24 @@
 from decimal import Decimal
 
+from flask import abort
+from sqlalchemy import false, select, update
 from web.api import HttpText, json_get, json_response
-from web.api.utils.sku import set_sku_unit_prices
 from web.auth import authorize
 from web.database import conn
-from web.database.model import CategoryItem, Product, ProductTypeId, Sku, UserRoleLevel
+from web.database.model import (
+    CategoryItem,
+    Product,
+    ProductTypeId,
+    ProductValue,
+    Sku,
+    UserRoleLevel,
+)
 from web.utils.generators import gen_slug
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.pricing import defer_sku_unit_prices, set_sku_unit_prices
+from bp_api.skus import clear_sku_names
 
 #
 # Configuration
@@ -74,7 +84,7 @@ def patch_products_id(product_id: int) -> Response:
             product.summary = summary
         if has_unit_price:
             product.unit_price = unit_price
-            set_sku_unit_prices(s, product_ids=[product.id])
+            defer_sku_unit_prices(s, product_ids=[product.id])
         if has_consent_required:
             product.consent_required = consent_required
         if has_file_url:
@@ -83,6 +93,37 @@ def patch_products_id(product_id: int) -> Response:
     return json_response()
 
 
+@api_bp.patch("/products/prices")
+@authorize(UserRoleLevel.ADMIN)
+def patch_products_prices() -> Response:
+    products, _ = json_get("products", list, default=[])
+    values, _ = json_get("values", list, default=[])
+    products = val_prices(products)
+    values = val_prices(values)
+
+    with conn.begin() as s:
+        # Check products and values
+        product_ids = [x["id"] for x in products]
+        value_ids = [x["id"] for x in values]
+        products_count = s.query(Product).filter(Product.id.in_(product_ids)).count()
+        values_count = (
+            s.query(ProductValue).filter(ProductValue.id.in_(value_ids)).count()
+        )
+        if products_count != len(product_ids) or values_count != len(value_ids):
+            return json_response(404, HttpText.HTTP_404)
+
+        # Update products and values in bulk
+        if products:
+            s.execute(update(Product), products)
+        if values:
+            s.execute(update(ProductValue), values)
+
+        # Recalculate skus in one pass
+        skus_count = set_sku_unit_prices(s, product_ids, value_ids)
+
+    return json_response(data={"skus_count": skus_count})
+
+
 @api_bp.delete("/products/<int:product_id>")
 @authorize(UserRoleLevel.ADMIN)
 def delete_products_id(product_id: int) -> Response:
@@ -94,18 +135,44 @@ def delete_products_id(product_id: int) -> Response:
         product.is_deleted = True
 
         # Delete skus
-        skus = s.query(Sku).filter(Sku.product_id == product_id).all()
-        for sku in skus:
-            sku.is_deleted = True
-
-            # Delete category items
-            category_items = s.query(CategoryItem).filter_by(sku_id=sku.id).all()
-            for category_item in category_items:
-                s.delete(category_item)
+        skus_count = (
+            s.query(Sku)
+            .filter(Sku.product_id == product_id, Sku.is_deleted == false())
+            .update({Sku.is_deleted: True}, synchronize_session=False)
+        )
+        clear_sku_names(s, [product_id])
+
+        # Delete category items
+        sku_ids = select(Sku.id).where(Sku.product_id == product_id)
+        category_items_count = (
+            s.query(CategoryItem)
+            .filter(CategoryItem.sku_id.in_(sku_ids))
+            .delete(synchronize_session=False)
+        )
 
-    return json_response()
+    # Media are kept, so the delete can be undone, see `purge_product_media`
+    data = {
+        "skus_count": skus_count,
+        "category_items_count": category_items_count,
+    }
+    return json_response(data=data)
 
 
 #
 # Functions
 #
+
+
+def val_prices(items: list) -> list[dict]:
+    prices = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int):
+            abort(json_response(400, HttpText.HTTP_400))
+        unit_price = item.get("unit_price")
+        if isinstance(unit_price, bool) or not isinstance(unit_price, (int, float)):
+            abort(json_response(400, HttpText.HTTP_400))
+        unit_price = Decimal(str(unit_price))
+        if not unit_price.is_finite():
+            abort(json_response(400, HttpText.HTTP_400))
+        prices[item["id"]] = unit_price
+    return [{"id": k, "unit_price": v} for k, v in prices.items()]
@@ -0,0 +1,406 @@
+import csv
+import io
+import itertools
+import json
+from decimal import Decimal, InvalidOperation
+from enum import StrEnum
+from typing import Iterable, Iterator
+
+from flask import request, stream_with_context
+from sqlalchemy.orm import Session, selectinload
+from web.api import JsonEncoder
+from web.api.utils.sku import get_sku_unit_price
+from web.auth import authorize
+from web.database import conn
+from web.database.model import (
+    Category,
+    CategoryItem,
+    Product,
+    ProductLink,
+    ProductLinkTypeId,
+    ProductOption,
+    ProductTypeId,
+    ProductValue,
+    Sku,
+    SkuDetail,
+    UserRoleLevel,
+)
+from web.i18n import _
+from web.logger import log
+from web.utils.generators import gen_slug
+from werkzeug import Response
+
+from bp_api import api_bp
+from bp_api.pricing import defer_sku_unit_prices
+from bp_api.skus import clear_sku_names, gen_sku_slug
+
+#
+# Configuration
+#
+
+
+class Text(StrEnum):
+    CATEGORY_UNKNOWN = _("API_PRODUCT_IMPORT_CATEGORY_UNKNOWN")
+    CHUNK_FAILED = _("API_PRODUCT_IMPORT_CHUNK_FAILED")
+    COLUMN_INVALID = _("API_PRODUCT_IMPORT_COLUMN_INVALID")
+    JSON_INVALID = _("API_PRODUCT_IMPORT_JSON_INVALID")
+    LINK_INCOMPLETE = _("API_PRODUCT_IMPORT_LINK_INCOMPLETE")
+    LINK_SKU_UNKNOWN = _("API_PRODUCT_IMPORT_LINK_SKU_UNKNOWN")
+    OPTION_MISSING = _("API_PRODUCT_IMPORT_OPTION_MISSING")
+    PRODUCT_DELETED = _("API_PRODUCT_IMPORT_PRODUCT_DELETED")
+    PRODUCT_MISSING = _("API_PRODUCT_IMPORT_PRODUCT_MISSING")
+    ROW_INVALID = _("API_PRODUCT_IMPORT_ROW_INVALID")
+
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_COLUMNS = {
+    "product": str,
+    "product_unit_price": Decimal,
+    "option": str,
+    "value": str,
+    "value_unit_price": Decimal,
+    "category_id": int,
+    "link_type": ProductLinkTypeId,
+    "link_sku": str,
+}
+
+
+#
+# Endpoints
+#
+
+
+@api_bp.post("/products/import")
+@authorize(UserRoleLevel.ADMIN)
+def post_products_import() -> Response:
+    """Import a catalogue from NDJSON or CSV.
+
+    Every row holds a product and optionally an option and value, a category
+    id and a link to a SKU slug, see `IMPORT_COLUMNS`. Rows are upserted by
+    slug in chunks of `IMPORT_CHUNK_SIZE`, each in its own transaction, after
+    which the SKUs of the touched products are generated.
+
+    The response streams one NDJSON line of progress per chunk, including the
+    errors of its rows, followed by a summary line. Like `post_products`, the
+    import never restores deleted products, rows of a deleted product are
+    rejected instead.
+    """
+
+    def generate() -> Iterator[str]:
+        rows_count = 0
+        errors_count = 0
+        for i, chunk in enumerate(iter_chunks(iter_rows(), IMPORT_CHUNK_SIZE)):
+            rows, errors = val_rows(chunk)
+            if rows:
+                try:
+                    with conn.begin() as s:
+                        errors.extend(import_rows(s, rows))
+                except Exception:
+                    log.error("Importing chunk %d failed", i, exc_info=True)
+                    errors.extend(
+                        {"line": x["line"], "error": Text.CHUNK_FAILED} for x in rows
+                    )
+            rows_count += len(chunk)
+            errors_count += len(errors)
+            progress = {"chunk": i, "rows_count": rows_count, "errors": errors}
+            yield json.dumps(progress, cls=JsonEncoder) + "\n"
+        summary = {"rows_count": rows_count, "errors_count": errors_count}
+        yield json.dumps(summary, cls=JsonEncoder) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+#
+# Functions
+#
+
+
+def iter_rows() -> Iterator[tuple[int, dict | str]]:
+    """Read the request body row by row as `(line, row or error)`."""
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8")
+    if request.mimetype == "text/csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, Text.JSON_INVALID
+            continue
+        yield line, row
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def val_rows(chunk: list[tuple[int, dict | str]]) -> tuple[list[dict], list[dict]]:
+    """Parse raw rows into typed rows, collecting an error per invalid row."""
+    rows, errors = [], []
+    for line, raw in chunk:
+        if not isinstance(raw, dict):
+            errors.append({"line": line, "error": raw or Text.ROW_INVALID})
+            continue
+        row: dict = {"line": line}
+        try:
+            for key, type_ in IMPORT_COLUMNS.items():
+                value = raw.get(key)
+                if value is None or value == "":
+                    row[key] = None
+                elif type_ is Decimal:
+                    row[key] = Decimal(str(value))
+                else:
+                    row[key] = type_(value)
+        except (InvalidOperation, TypeError, ValueError):
+            errors.append({"line": line, "error": Text.COLUMN_INVALID, "column": key})
+            continue
+        if not row["product"]:
+            errors.append({"line": line, "error": Text.PRODUCT_MISSING})
+        elif row["value"] and not row["option"]:
+            errors.append({"line": line, "error": Text.OPTION_MISSING})
+        elif bool(row["link_type"]) != bool(row["link_sku"]):
+            errors.append({"line": line, "error": Text.LINK_INCOMPLETE})
+        else:
+            rows.append(row)
+    return rows, errors
+
+
+def import_rows(s: Session, rows: list[dict]) -> list[dict]:
+    """Upsert one chunk of rows and return the errors of rows that failed.
+
+    Existing rows are looked up once per level with precomputed slugs, and
+    new rows are inserted with a single flush per level.
+    """
+
+    for row in rows:
+        row["product_slug"] = gen_slug(row["product"])
+        row["option_slug"] = gen_slug(row["option"]) if row["option"] else None
+        row["value_slug"] = gen_slug(row["value"]) if row["value"] else None
+
+    # Skip rows of deleted products
+    products = {
+        x.slug: x
+        for x in s.query(Product).filter(
+            Product.slug.in_({x["product_slug"] for x in rows})
+        )
+    }
+    deleted_slugs = {k for k, v in products.items() if v.is_deleted}
+    errors = [
+        {"line": x["line"], "error": Text.PRODUCT_DELETED}
+        for x in rows
+        if x["product_slug"] in deleted_slugs
+    ]
+    rows = [x for x in rows if x["product_slug"] not in deleted_slugs]
+    products = {k: v for k, v in products.items() if k not in deleted_slugs}
+    if not rows:
+        return errors
+
+    # Upsert products
+    for row in rows:
+        product = products.get(row["product_slug"])
+        if product is None:
+            product = Product(
+                type_id=ProductTypeId.PHYSICAL, name=row["product"], unit_price=1
+            )
+            products[row["product_slug"]] = product
+            s.add(product)
+        if row["product_unit_price"] is not None:
+            product.unit_price = row["product_unit_price"]
+    s.flush()
+    product_ids = {x.id for x in products.values()}
+
+    # Upsert product options
+    options = {
+        (x.product_id, x.slug): x
+        for x in s.query(ProductOption).filter(
+            ProductOption.product_id.in_(product_ids)
+        )
+    }
+    for row in rows:
+        if row["option_slug"] is None:
+            continue
+        product = products[row["product_slug"]]
+        option = options.get((product.id, row["option_slug"]))
+        if option is None:
+            option = ProductOption(product_id=product.id, name=row["option"])
+            options[(product.id, row["option_slug"])] = option
+            s.add(option)
+        option.is_deleted = False
+    s.flush()
+    option_ids = {x.id for x in options.values()}
+
+    # Upsert product values
+    values = {
+        (x.option_id, x.slug): x
+        for x in s.query(ProductValue).filter(ProductValue.option_id.in_(option_ids))
+    }
+    for row in rows:
+        if row["value_slug"] is None:
+            continue
+        product = products[row["product_slug"]]
+        option = options[(product.id, row["option_slug"])]
+        value = values.get((option.id, row["value_slug"]))
+        if value is None:
+            value = ProductValue(option_id=option.id, name=row["value"])
+            values[(option.id, row["value_slug"])] = value
+            s.add(value)
+        value.is_deleted = False
+        if row["value_unit_price"] is not None:
+            value.unit_price = row["value_unit_price"]
+    s.flush()
+
+    # Generate skus and recalculate the prices of existing ones
+    skus = upsert_skus(s, product_ids)
+    defer_sku_unit_prices(s, product_ids=product_ids)
+
+    errors.extend(upsert_category_items(s, rows, products, skus))
+    errors.extend(upsert_product_links(s, rows, products))
+    return errors
+
+
+def upsert_skus(s: Session, product_ids: set[int]) -> dict[int, list[Sku]]:
+    """Generate a SKU for every combination of values, like `post_skus`."""
+    products = (
+        s.query(Product)
+        .options(selectinload(Product.options).selectinload(ProductOption.values))
+        .filter(Product.id.in_(product_ids))
+        .all()
+    )
+    skus: dict[int, list[Sku]] = {x: [] for x in product_ids}
+    for sku in (
+        s.query(Sku)
+        .options(selectinload(Sku.details))
+        .filter(Sku.product_id.in_(product_ids))
+    ):
+        skus[sku.product_id].append(sku)
+
+    new_skus = []
+    for product in products:
+        value_sets = []
+        for option in sorted(product.options, key=lambda x: x.id):
+            if option.is_deleted:
+                continue
+            value_sets.append([x for x in option.values if not x.is_deleted])
+        for combination in itertools.product(*value_sets):
+            values = sorted(combination, key=lambda x: x.id)
+            value_ids = [x.id for x in values]
+            sku = next((x for x in skus[product.id] if x.value_ids == value_ids), None)
+            if sku is not None:
+                sku.is_deleted = False
+                continue
+            sku = Sku(
+                product_id=product.id,
+                slug=gen_sku_slug(product, values),
+                stock=1,
+                is_visible=True,
+                unit_price=get_sku_unit_price(product, values),
+            )
+            new_skus.append((sku, values))
+            skus[product.id].append(sku)
+
+    s.add_all([x for x, _ in new_skus])
+    s.flush()
+    s.add_all(
+        [
+            SkuDetail(sku_id=sku.id, option_id=x.option_id, value_id=x.id)
+            for sku, values in new_skus
+            for x in values
+        ]
+    )
+    s.flush()
+    clear_sku_names(s, product_ids)
+    return skus
+
+
+def upsert_category_items(
+    s: Session,
+    rows: list[dict],
+    products: dict[str, Product],
+    skus: dict[int, list[Sku]],
+) -> list[dict]:
+    rows = [x for x in rows if x["category_id"] is not None]
+    if not rows:
+        return []
+
+    category_ids = {
+        x
+        for (x,) in s.query(Category.id).filter(
+            Category.id.in_({x["category_id"] for x in rows})
+        )
+    }
+    sku_ids = {x.id for x in itertools.chain(*skus.values()) if not x.is_deleted}
+    existing = {
+        tuple(x)
+        for x in s.query(CategoryItem.category_id, CategoryItem.sku_id).filter(
+            CategoryItem.category_id.in_(category_ids),
+            CategoryItem.sku_id.in_(sku_ids),
+        )
+    }
+
+    errors = []
+    category_items = []
+    for row in rows:
+        if row["category_id"] not in category_ids:
+            errors.append({"line": row["line"], "error": Text.CATEGORY_UNKNOWN})
+            continue
+        product = products[row["product_slug"]]
+        for sku in skus[product.id]:
+            key = (row["category_id"], sku.id)
+            if sku.is_deleted or key in existing:
+                continue
+            existing.add(key)
+            category_items.append(
+                CategoryItem(category_id=row["category_id"], sku_id=sku.id)
+            )
+    s.add_all(category_items)
+    s.flush()
+    return errors
+
+
+def upsert_product_links(
+    s: Session,
+    rows: list[dict],
+    products: dict[str, Product],
+) -> list[dict]:
+    rows = [x for x in rows if x["link_sku"] is not None]
+    if not rows:
+        return []
+
+    sku_ids = {
+        x.slug: x.id
+        for x in s.query(Sku.slug, Sku.id).filter(
+            Sku.slug.in_({x["link_sku"] for x in rows})
+        )
+    }
+    product_ids = {products[x["product_slug"]].id for x in rows}
+    existing = {
+        tuple(x)
+        for x in s.query(
+            ProductLink.product_id, ProductLink.type_id, ProductLink.sku_id
+        ).filter(ProductLink.product_id.in_(product_ids))
+    }
+
+    errors = []
+    product_links = []
+    for row in rows:
+        sku_id = sku_ids.get(row["link_sku"])
+        if sku_id is None:
+            errors.append({"line": row["line"], "error": Text.LINK_SKU_UNKNOWN})
+            continue
+        key = (products[row["product_slug"]].id, row["link_type"], sku_id)
+        if key in existing:
+            continue
+        existing.add(key)
+        product_id, type_id, sku_id = key
+        product_links.append(
+            ProductLink(product_id=product_id, type_id=type_id, sku_id=sku_id)
+        )
+    s.add_all(product_links)
+    s.flush()
+    return errors
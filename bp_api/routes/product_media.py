@@ -1,17 +1,23 @@
-import os
 import re
 
 from flask import request
-from web import cdn
+from sqlalchemy.orm import joinedload
 from web.api import HttpText, json_get, json_response
 from web.auth import authorize
 from web.database import conn
-from web.database.model import File, FileTypeId, Product, ProductMedia, UserRoleLevel
+from web.database.model import File, Product, ProductMedia, UserRoleLevel
 from web.setup import config
 from werkzeug import Response
-from werkzeug.utils import secure_filename
 
 from bp_api import api_bp
+from bp_api.media import (
+    cdn_delete_queue,
+    gen_file_paths,
+    gen_media_resources,
+    gen_media_uploads,
+    insert_media_files,
+    upload_media,
+)
 
 #
 # Configuration
@@ -46,42 +52,34 @@ def post_products_id_media(product_id: int) -> Response:
                 if match is not None:
                     sequence = int(match.group(1))
 
-        for request_file in request.files.getlist("file"):
-            # Increment sequence
-            sequence += 1
-
-            # Create details
-            if request_file.filename is None:
-                continue
-            name, extension = os.path.splitext(request_file.filename)
-            if config.CDN_AUTO_NAMING:
-                name = f"{product.slug}-{sequence}"
-            else:
-                name = secure_filename(name)
-            extension = extension.lstrip(".").lower()
-            filename = f"{name}.{extension}"
-            path = os.path.join("product", product.slug, filename)
-
-            # Get media type
-            if extension in config.CDN_IMAGE_EXTS:
-                type_id = FileTypeId.IMAGE
-            elif extension in config.CDN_VIDEO_EXTS:
-                type_id = FileTypeId.VIDEO
-            else:
-                continue
-
-            # Upload media
-            cdn.upload(request_file, path)
-
-            # Insert file and product media
-            file_ = File(path=path, type_id=type_id)
-            s.add(file_)
-            s.flush()
-            product_media = ProductMedia(product_id=product_id, file_id=file_.id)
-            s.add(product_media)
-            s.flush()
+        # Create details
+        uploads = gen_media_uploads(
+            request.files.getlist("file"), "product", product.slug, sequence
+        )
 
-    return json_response()
+    # Upload media outside of the transaction
+    upload_media(uploads)
+
+    with conn.begin() as s:
+        # Insert files and product media
+        files = insert_media_files(s, uploads)
+        s.add_all([ProductMedia(product_id=product_id, file_id=x.id) for x in files])
+
+    return json_response(data=[x.to_dict() for x in uploads])
+
+
+@api_bp.get("/products/<int:product_id>/media")
+def get_products_id_media(product_id: int) -> Response:
+    with conn.begin() as s:
+        product_media = (
+            s.query(ProductMedia)
+            .options(joinedload(ProductMedia.file_))
+            .filter_by(product_id=product_id)
+            .order_by(ProductMedia.order, ProductMedia.id)
+            .all()
+        )
+        resources = gen_media_resources(s, product_media)
+    return json_response(data=resources)
 
 
 @api_bp.patch("/products/<int:product_id>/media/<int:media_id>")
@@ -124,13 +122,16 @@ def delete_products_id_media_id(product_id: int, media_id) -> Response:
         if not file:
             return json_response(404, HttpText.HTTP_404)
 
-        # Remove file from CDN
-        cdn.delete(file.path)
+        # Queue files for deletion from CDN
+        cdn_delete_queue.enqueue(s, gen_file_paths(s, [file.id]))
 
         # Delete product media and file
         s.delete(file)
         s.delete(product_media)
 
+    # Delete files from CDN
+    cdn_delete_queue.dispatch()
+
     return json_response()
 
 
@@ -1,5 +1,4 @@
-from sqlalchemy import false
-from sqlalchemy.orm import contains_eager
+from sqlalchemy import false, select
 from web.api import HttpText, json_get, json_response
 from web.auth import authorize
 from web.database import conn
@@ -14,6 +13,7 @@ from web.utils.generators import gen_slug
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.skus import clear_sku_names
 
 #
 # Configuration
@@ -41,6 +41,7 @@ def post_products_id_options(product_id: int) -> Response:
         if product_option:
             if product_option.is_deleted:
                 product_option.is_deleted = False
+                clear_sku_names(s, [product_id])
                 return json_response()
             else:
                 return json_response(409, HttpText.HTTP_409)
@@ -87,28 +88,25 @@ def delete_products_id_options_id(product_id: int, option_id: int) -> Response:
         if not product_option:
             return json_response(404, HttpText.HTTP_404)
         product_option.is_deleted = True
-        s.flush()
 
         # Delete product values
-        product_values = (
-            s.query(ProductValue).filter_by(option_id=option_id, is_deleted=False).all()
+        values_count = (
+            s.query(ProductValue)
+            .filter_by(option_id=option_id, is_deleted=False)
+            .update({ProductValue.is_deleted: True}, synchronize_session=False)
         )
-        for product_value in product_values:
-            product_value.is_deleted = True
-        s.flush()
 
         # Delete skus
-        skus = (
+        sku_ids = select(SkuDetail.sku_id).where(SkuDetail.option_id == option_id)
+        skus_count = (
             s.query(Sku)
-            .join(Sku.details)
-            .options(contains_eager(Sku.details))
-            .filter(SkuDetail.option_id == option_id, Sku.is_deleted == false())
-            .all()
+            .filter(Sku.id.in_(sku_ids), Sku.is_deleted == false())
+            .update({Sku.is_deleted: True}, synchronize_session=False)
         )
-        for sku in skus:
-            sku.is_deleted = True
+        clear_sku_names(s, [product_id])
 
-    return json_response()
+    data = {"values_count": values_count, "skus_count": skus_count}
+    return json_response(data=data)
 
 
 #
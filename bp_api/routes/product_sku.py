@@ -6,10 +6,10 @@ from web.auth import authorize
 from web.database import conn
 from web.database.model import Product, ProductValue, Sku, SkuDetail, UserRoleLevel
 from web.logger import log
-from web.utils.generators import gen_slug
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.skus import clear_sku_names, gen_sku_slug
 
 #
 # Configuration
@@ -51,8 +51,7 @@ def post_skus(product_id: int) -> Response:
                 log.info("Restoring SKU %d", sku.id)
                 sku.is_deleted = False
             else:
-                slug_parts = [product.name, *(x.name for x in values)]
-                slug = gen_slug("-".join(slug_parts))
+                slug = gen_sku_slug(product, values)
                 unit_price = get_sku_unit_price(product, values)
                 sku = Sku(
                     product_id=product_id,
@@ -69,6 +68,9 @@ def post_skus(product_id: int) -> Response:
                 ]
                 s.add_all(sku_details)
 
+        # Names are regenerated from the current product and values
+        clear_sku_names(s, [product_id])
+
     return json_response()
 
 
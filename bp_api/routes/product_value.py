@@ -1,16 +1,23 @@
 from decimal import Decimal
 
-from sqlalchemy import false
-from sqlalchemy.orm import contains_eager
+from sqlalchemy import false, select
+from sqlalchemy.orm import Session
 from web.api import HttpText, json_get, json_response
-from web.api.utils.sku import set_sku_unit_prices
 from web.auth import authorize
 from web.database import conn
-from web.database.model import ProductValue, Sku, SkuDetail, UserRoleLevel
+from web.database.model import (
+    ProductOption,
+    ProductValue,
+    Sku,
+    SkuDetail,
+    UserRoleLevel,
+)
 from web.utils.generators import gen_slug
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.pricing import defer_sku_unit_prices
+from bp_api.skus import clear_sku_names
 
 #
 # Configuration
@@ -40,6 +47,7 @@ def post_products_id_values(product_id: int) -> Response:
         if product_value:
             if product_value.is_deleted:
                 product_value.is_deleted = False
+                clear_sku_names(s, get_product_ids(s, product_value))
                 return json_response()
             else:
                 return json_response(409, HttpText.HTTP_409)
@@ -74,7 +82,7 @@ def patch_products_id_values_id(product_id: int, value_id: int) -> Response:
             product_value.media_id = media_id
         if has_unit_price:
             product_value.unit_price = unit_price
-            set_sku_unit_prices(s, value_ids=[product_value.id])
+            defer_sku_unit_prices(s, value_ids=[product_value.id])
         if has_order:
             product_value.order = order
 
@@ -92,19 +100,27 @@ def delete_products_id_values_id(product_id: int, value_id: int) -> Response:
         product_value.is_deleted = True
 
         # Delete skus
-        skus = (
+        sku_ids = select(SkuDetail.sku_id).where(SkuDetail.value_id == value_id)
+        skus_count = (
             s.query(Sku)
-            .join(Sku.details)
-            .options(contains_eager(Sku.details))
-            .filter(SkuDetail.value_id == value_id, Sku.is_deleted == false())
-            .all()
+            .filter(Sku.id.in_(sku_ids), Sku.is_deleted == false())
+            .update({Sku.is_deleted: True}, synchronize_session=False)
         )
-        for sku in skus:
-            sku.is_deleted = True
+        clear_sku_names(s, get_product_ids(s, product_value))
 
-    return json_response()
+    return json_response(data={"skus_count": skus_count})
 
 
 #
 # Functions
 #
+
+
+def get_product_ids(s: Session, product_value: ProductValue) -> list[int]:
+    return list(
+        s.scalars(
+            select(ProductOption.product_id).where(
+                ProductOption.id == product_value.option_id
+            )
+        )
+    )
@@ -5,6 +5,7 @@ from web.database.model import Region, UserRoleLevel
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import cached_response, invalidates_response
 
 #
 # Configuration
@@ -29,6 +30,7 @@ class RegionAPI(API):
 
 @api_bp.post("/regions")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("regions")
 def post_regions() -> Response:
     api = RegionAPI()
     data = api.gen_data(api.post_columns)
@@ -40,6 +42,7 @@ def post_regions() -> Response:
 
 
 @api_bp.get("/regions")
+@cached_response("regions")
 def get_regions() -> Response:
     api = RegionAPI()
     with conn.begin() as s:
@@ -49,6 +52,7 @@ def get_regions() -> Response:
 
 
 @api_bp.get("/regions/<int:region_id>")
+@cached_response("regions")
 def get_regions_id(region_id: int) -> Response:
     api = RegionAPI()
     with conn.begin() as s:
@@ -59,6 +63,7 @@ def get_regions_id(region_id: int) -> Response:
 
 @api_bp.delete("/regions/<int:region_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("regions")
 def delete_regions_id(region_id: int) -> Response:
     api = RegionAPI()
     with conn.begin() as s:
@@ -8,6 +8,7 @@ from web.database.model import AppSettings, UserRoleLevel
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import cached_response, invalidates_response
 
 #
 # Configuration
@@ -33,6 +34,7 @@ class SettingsAPI(API):
 
 @api_bp.get("/settings")
 @authorize(UserRoleLevel.ADMIN)
+@cached_response("settings")
 def get_settings() -> Response:
     api = SettingsAPI()
     with conn.begin() as s:
@@ -43,6 +45,7 @@ def get_settings() -> Response:
 
 @api_bp.patch("/settings")
 @authorize(UserRoleLevel.ADMIN)
+@invalidates_response("settings")
 def patch_settings() -> Response:
     api = SettingsAPI()
     data = api.gen_data(api.patch_columns)
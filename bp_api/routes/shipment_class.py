@@ -6,6 +6,8 @@ from werkzeug import Response
 
 from bp_api import api_bp
 
+from .shipment_method import invalidate_shipment_index
+
 #
 # Configuration
 #
@@ -18,6 +20,7 @@ from bp_api import api_bp
 
 @api_bp.post("/shipment-classes")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def post_shipment_classes() -> Response:
     name, _ = json_get("name", str, nullable=False)
     order, _ = json_get("order", int, nullable=False)
@@ -39,6 +42,7 @@ def post_shipment_classes() -> Response:
 
 @api_bp.patch("/shipment-classes/<int:shipment_class_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def patch_shipment_classes_id(shipment_class_id: int) -> Response:
     order, has_order = json_get("order", int)
 
@@ -57,6 +61,7 @@ def patch_shipment_classes_id(shipment_class_id: int) -> Response:
 
 @api_bp.delete("/shipment-classes/<int:shipment_class_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def delete_shipment_classes_id(shipment_class_id: int) -> Response:
     with conn.begin() as s:
         # Delete shipment class
@@ -1,6 +1,9 @@
+import functools
+import threading
+import time
 from decimal import Decimal
+from typing import Callable
 
-from sqlalchemy import false, or_
 from sqlalchemy.orm import Session, joinedload
 from web.api import API, HttpText, json_get, json_response
 from web.auth import authorize, current_user
@@ -11,6 +14,7 @@ from web.database.model import (
     ShipmentClass,
     ShipmentMethod,
     ShipmentZone,
+    Shipping,
     Sku,
     UserRoleLevel,
 )
@@ -24,6 +28,9 @@ from bp_api import api_bp
 #
 
 
+SHIPMENT_INDEX_TTL_S = 300
+
+
 class ShipmentMethodAPI(API):
     model = ShipmentMethod
     get_filters = {
@@ -39,6 +46,115 @@ class ShipmentMethodAPI(API):
     }
 
 
+class ShipmentIndex:
+    """In-process index of all active shipment classes, zones and methods.
+
+    The index is built once from the database and resolves shipment methods
+    without any queries. It is rebuilt after the admin endpoints write and
+    when it is older than `ttl_s`, which bounds staleness across workers.
+    """
+
+    def __init__(self, ttl_s: int) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._built_at: float | None = None
+        self._class_keys: dict[int, tuple[int, int]] = {}
+        self._zones: list[tuple[int, int | None, int | None]] = []
+        self._methods: dict[tuple[int, int], list[ShipmentMethod]] = {}
+        self._class_cache: dict[frozenset[int], int | None] = {}
+        self._zone_cache: dict[tuple[int | None, int | None], int | None] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+
+    def resolve(
+        self,
+        s: Session,
+        class_ids: set[int],
+        country_id: int | None,
+        region_id: int | None,
+    ) -> list[ShipmentMethod]:
+        with self._lock:
+            if self._is_stale():
+                self._build()
+            class_id = self._resolve_class(frozenset(class_ids))
+            zone_id = self._resolve_zone(country_id, region_id)
+            if class_id is None or zone_id is None:
+                return []
+            methods = self._methods.get((class_id, zone_id), [])
+        return [s.merge(x, load=False) for x in methods]
+
+    def _is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return time.monotonic() - self._built_at > self.ttl_s
+
+    def _build(self) -> None:
+        # Use a separate session, so the detached instances are never shared
+        # with the session of the caller.
+        with conn.begin() as s:
+            classes = s.query(ShipmentClass).filter_by(is_deleted=False).all()
+            zones = s.query(ShipmentZone).filter_by(is_deleted=False).all()
+            methods = (
+                s.query(ShipmentMethod)
+                .filter_by(is_deleted=False)
+                .order_by(ShipmentMethod.unit_price, ShipmentMethod.id)
+                .all()
+            )
+            s.expunge_all()
+
+        self._class_keys = {x.id: (x.order, x.id) for x in classes}
+        self._zones = [
+            (x.id, x.country_id, x.region_id)
+            for x in sorted(zones, key=lambda x: (x.order, x.id))
+        ]
+        self._methods = {}
+        for method in methods:
+            key = (method.class_id, method.zone_id)
+            self._methods.setdefault(key, []).append(method)
+        self._class_cache = {}
+        self._zone_cache = {}
+        self._built_at = time.monotonic()
+
+    def _resolve_class(self, class_ids: frozenset[int]) -> int | None:
+        if class_ids not in self._class_cache:
+            keys = [self._class_keys[x] for x in class_ids if x in self._class_keys]
+            self._class_cache[class_ids] = min(keys)[1] if keys else None
+        return self._class_cache[class_ids]
+
+    def _resolve_zone(
+        self,
+        country_id: int | None,
+        region_id: int | None,
+    ) -> int | None:
+        key = (country_id, region_id)
+        if key not in self._zone_cache:
+            self._zone_cache[key] = next(
+                (
+                    zone_id
+                    for zone_id, zone_country_id, zone_region_id in self._zones
+                    if (zone_country_id is not None and zone_country_id == country_id)
+                    or (zone_region_id is not None and zone_region_id == region_id)
+                ),
+                None,
+            )
+        return self._zone_cache[key]
+
+
+shipment_index = ShipmentIndex(SHIPMENT_INDEX_TTL_S)
+
+
+def invalidate_shipment_index(f: Callable) -> Callable[..., Response]:
+    @functools.wraps(f)
+    def wrap(*args, **kwargs) -> Response:
+        resp = f(*args, **kwargs)
+        shipment_index.invalidate()
+        return resp
+
+    return wrap
+
+
 #
 # Endpoints
 #
@@ -46,6 +162,7 @@ class ShipmentMethodAPI(API):
 
 @api_bp.post("/shipment-methods")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def post_shipment_methods() -> Response:
     class_id, _ = json_get("class_id", int, nullable=False)
     name, _ = json_get("name", str, nullable=False)
@@ -88,6 +205,7 @@ def get_shipment_methods_id(shipment_method_id: int) -> Response:
 
 @api_bp.patch("/shipment-methods/<int:shipment_method_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def patch_shipment_methods_id(shipment_method_id: int) -> Response:
     name, has_name = json_get("name", str)
     requires_billing_phone, has_requires_billing_phone = json_get(
@@ -116,6 +234,7 @@ def patch_shipment_methods_id(shipment_method_id: int) -> Response:
 
 @api_bp.delete("/shipment-methods/<int:shipment_method_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def delete_shipment_methods_id(shipment_method_id: int) -> Response:
     with conn.begin() as s:
         # Delete shipment method
@@ -149,6 +268,8 @@ def set_shipment_methods(
             joinedload(Cart.items, CartItem.cart),
             joinedload(Cart.items, CartItem.sku),
             joinedload(Cart.items, CartItem.sku, Sku.product),
+            joinedload(Cart.shipping),
+            joinedload(Cart.shipping, Shipping.country),
         )
         .filter_by(id=cart_id, user_id=current_user.id)
         .first()
@@ -156,23 +277,16 @@ def set_shipment_methods(
     if cart is None:
         return []
 
+    return resolve_shipment_methods(s, cart)
+
+
+def resolve_shipment_methods(s: Session, cart: Cart) -> list[ShipmentMethod]:
     # Get all possible shipment class ids
-    shipment_class_ids = []
+    shipment_class_ids = set()
     for item in cart.items:
         shipment_class_id = item.sku.product.shipment_class_id
         if shipment_class_id is not None:
-            shipment_class_ids.append(shipment_class_id)
-
-    # Determine the shipment class
-    shipment_class = (
-        s.query(ShipmentClass)
-        .filter(
-            ShipmentClass.id.in_(shipment_class_ids),
-            ShipmentClass.is_deleted == false(),
-        )
-        .order_by(ShipmentClass.order)
-        .first()
-    )
+            shipment_class_ids.add(shipment_class_id)
 
     # Get country_id and region_id
     if cart.shipping:
@@ -183,32 +297,5 @@ def set_shipment_methods(
         country_id = current_locale.country.id
         region_id = current_locale.country.region_id
 
-    # Determine the shipment zone
-    shipment_zone = (
-        s.query(ShipmentZone)
-        .filter(
-            or_(
-                ShipmentZone.country_id == country_id,
-                ShipmentZone.region_id == region_id,
-            ),
-            ShipmentZone.is_deleted == false(),
-        )
-        .order_by(ShipmentZone.order)
-        .first()
-    )
-
-    # Get shipment methods
-    if shipment_zone and shipment_class:
-        shipment_methods = (
-            s.query(ShipmentMethod)
-            .filter_by(
-                class_id=shipment_class.id,
-                zone_id=shipment_zone.id,
-                is_deleted=False,
-            )
-            .order_by(ShipmentMethod.unit_price)
-            .all()
-        )
-    else:
-        shipment_methods = []
-    return shipment_methods
+    # Get shipment methods ordered by unit price
+    return shipment_index.resolve(s, shipment_class_ids, country_id, region_id)
@@ -6,6 +6,8 @@ from werkzeug import Response
 
 from bp_api import api_bp
 
+from .shipment_method import invalidate_shipment_index
+
 #
 # Configuration
 #
@@ -18,6 +20,7 @@ from bp_api import api_bp
 
 @api_bp.post("/shipment-zones")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def post_shipment_zones() -> Response:
     country_id, _ = json_get("country_id", int)
     order, _ = json_get("order", int, nullable=False)
@@ -53,6 +56,7 @@ def post_shipment_zones() -> Response:
 
 @api_bp.patch("/shipment-zones/<int:shipment_zone_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def patch_shipment_zones_id(shipment_zone_id: int) -> Response:
     country_id, has_country_id = json_get("country_id", int)
     order, has_order = json_get("order", int)
@@ -77,6 +81,7 @@ def patch_shipment_zones_id(shipment_zone_id: int) -> Response:
 
 @api_bp.delete("/shipment-zones/<int:shipment_zone_id>")
 @authorize(UserRoleLevel.ADMIN)
+@invalidate_shipment_index
 def delete_shipment_zones_id(shipment_zone_id: int) -> Response:
     with conn.begin() as s:
         # Delete shipment zone
@@ -7,8 +7,9 @@ from web.database.model import Cart, Order, Shipping
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.cache import check_etag, set_etag
 
-from .cart import set_shipment, set_vat
+from .cart import set_carts_vat_shipment
 
 #
 # Configuration
@@ -85,9 +86,14 @@ def get_shippings_id(shipping_id: int) -> Response:
     api.validate_request()
     with conn.begin() as s:
         filters = {Shipping.user_id == current_user.id}
+        etag = check_etag(
+            s.query(Shipping.id, Shipping.updated_at).filter(
+                Shipping.id == shipping_id, *filters
+            )
+        )
         model: Shipping = api.get(s, shipping_id, *filters)
         resource = api.gen_resource(s, model)
-    return json_response(data=resource)
+    return set_etag(json_response(data=resource), etag)
 
 
 @api_bp.patch("/shippings/<int:shipping_id>")
@@ -134,10 +140,7 @@ def clear_default(s: Session, data: dict, model: Shipping) -> None:
 
 
 def set_cart(s: Session, data: dict, model: Shipping) -> None:
-    carts = s.query(Cart).filter_by(shipping_id=model.id).all()
-    for cart in carts:
-        set_vat(s, data, cart)
-        set_shipment(s, data, cart)
+    set_carts_vat_shipment(s, Cart.shipping_id == model.id)
 
 
 def val_order(s: Session, data: dict, model: Shipping) -> None:
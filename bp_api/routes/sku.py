@@ -1,3 +1,21 @@
+from datetime import datetime, timedelta
+
+from flask import abort, request, url_for
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    and_,
+    cast,
+    column,
+    func,
+    or_,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
 from web.api import API, HttpText, json_get, json_response
 from web.auth import authorize
 from web.database import conn
@@ -7,9 +25,11 @@ from web.database.model import (
     Sku,
     UserRoleLevel,
 )
+from web.locale import current_locale
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_api.models import SkuName
 
 #
 # Configuration
@@ -26,6 +46,7 @@ class SkuAPI(API):
         Sku.is_deleted,
         Sku.is_visible,
         Sku.product_id,
+        Sku.updated_at,
         "name",
     }
     get_filters = {
@@ -33,6 +54,28 @@ class SkuAPI(API):
     }
 
 
+SKU_NAME_TTL_S = 3600
+SKU_PAGE_LIMIT = 100
+SKU_PAGE_MAX_LIMIT = 1000
+SKU_FIELDS = {
+    "id": Sku.id,
+    "slug": Sku.slug,
+    "stock": Sku.stock,
+    "unit_price": Sku.unit_price,
+    "is_deleted": Sku.is_deleted,
+    "is_visible": Sku.is_visible,
+    "product_id": Sku.product_id,
+    "updated_at": Sku.updated_at,
+    "name": SkuName.name,
+}
+SKU_PATCH_COLUMNS = {
+    "attributes": (dict,),
+    "is_visible": (bool,),
+    "number": (str, type(None)),
+    "stock": (int,),
+}
+
+
 #
 # Endpoints
 #
@@ -65,16 +108,107 @@ def patch_skus_id(sku_id: int) -> Response:
     return json_response()
 
 
+@api_bp.patch("/skus")
+@authorize(UserRoleLevel.ADMIN)
+def patch_skus() -> Response:
+    """Update many SKUs at once.
+
+    Every item holds the id, optionally the `updated_at` that was read, and
+    the columns to update. Items with the same columns share one UPDATE
+    statement. When a SKU does not exist or changed since `updated_at`, the
+    whole request is rolled back.
+    """
+
+    items, _ = json_get("skus", list, nullable=False)
+    items = val_skus(items)
+
+    with conn.begin() as s:
+        # Check skus
+        sku_ids = [x["id"] for x in items]
+        found_ids = set(s.scalars(select(Sku.id).where(Sku.id.in_(sku_ids))))
+        if len(found_ids) != len(sku_ids):
+            return json_response(404, HttpText.HTTP_404)
+
+        # Update skus grouped by columns
+        groups: dict[tuple, list[dict]] = {}
+        for item in items:
+            keys = tuple(sorted(item.keys() - {"id", "updated_at"}))
+            groups.setdefault(keys, []).append(item)
+        updated_at = {}
+        for keys, group in groups.items():
+            updated_at.update(update_skus(s, keys, group))
+
+        # Check for concurrent updates
+        conflict_ids = [x for x in sku_ids if x not in updated_at]
+        if conflict_ids:
+            abort(json_response(409, HttpText.HTTP_409, data={"ids": conflict_ids}))
+
+    data = [{"id": x, "updated_at": updated_at[x]} for x in sku_ids]
+    return json_response(data=data)
+
+
 @api_bp.get("/skus")
 @authorize(UserRoleLevel.ADMIN)
 def get_skus() -> Response:
+    """List SKUs ordered by slug.
+
+    All SKUs are listed unless `after` or `limit` is given. Pages are then
+    selected with `after`, the slug of the last SKU of the previous page, and
+    `limit`, and the link to the next page is returned while more SKUs follow.
+    Only the columns listed in `fields` are selected.
+    """
+
     api = SkuAPI()
     data = api.gen_query_data(api.get_filters)
+    after = request.args.get("after", type=str)
+    limit = request.args.get("limit", type=int)
+    fields = request.args.get("fields", type=str)
+    is_paginated = after is not None or limit is not None
+    if limit is None:
+        limit = SKU_PAGE_LIMIT
+    if not 0 < limit <= SKU_PAGE_MAX_LIMIT:
+        return json_response(400, HttpText.HTTP_400)
+    if fields is not None:
+        keys = fields.split(",")
+        if not keys or any(x not in SKU_FIELDS for x in keys):
+            return json_response(400, HttpText.HTTP_400)
+    else:
+        keys = list(SKU_FIELDS)
+
     with conn.begin() as s:
-        filters = api.gen_query_filters(data)
-        models: list[Sku] = api.list_(s, *filters, order_by=Sku.slug)
-        resources = api.gen_resources(s, models)
-    return json_response(data=resources)
+        # Select a page of skus
+        filters = list(api.gen_query_filters(data))
+        if after is not None:
+            filters.append(Sku.slug > after)
+        columns = {x: SKU_FIELDS[x] for x in keys}
+        columns.update({"id": Sku.id, "slug": Sku.slug})
+        query = (
+            s.query(*(x.label(k) for k, x in columns.items()))
+            .select_from(Sku)
+            .outerjoin(SkuName, join_sku_names())
+            .filter(*filters)
+            .order_by(Sku.slug)
+        )
+        if is_paginated:
+            rows = query.limit(limit + 1).all()
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = query.all()
+            has_next = False
+        resources = [x._asdict() for x in rows]
+
+        # Store names that have not been generated yet
+        if "name" in keys:
+            set_sku_names(s, [x for x in resources if x["name"] is None])
+
+    links = {}
+    if has_next:
+        args = request.args.to_dict()
+        args.update(after=resources[-1]["slug"], limit=limit)
+        links["next"] = url_for(request.endpoint, **args)
+    resources = [{k: x[k] for k in keys} for x in resources]
+    return json_response(data=resources, links=links)
 
 
 @api_bp.delete("/skus/<int:sku_id>")
@@ -104,3 +238,93 @@ def delete_skus_id(sku_id: int) -> Response:
 #
 # Functions
 #
+
+
+def val_skus(items: list) -> list[dict]:
+    skus = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int):
+            abort(json_response(400, HttpText.HTTP_400))
+        sku = {"id": item["id"], "updated_at": None}
+        if item.get("updated_at") is not None:
+            try:
+                sku["updated_at"] = datetime.fromisoformat(item["updated_at"])
+            except (TypeError, ValueError):
+                abort(json_response(400, HttpText.HTTP_400))
+        for key, types in SKU_PATCH_COLUMNS.items():
+            if key not in item:
+                continue
+            value = item[key]
+            # Booleans are ints in Python, so only accept them for bool columns
+            if not isinstance(value, types) or (
+                isinstance(value, bool) and bool not in types
+            ):
+                abort(json_response(400, HttpText.HTTP_400))
+            sku[key] = value
+        if sku.keys() == {"id", "updated_at"}:
+            abort(json_response(400, HttpText.HTTP_400))
+        skus[sku["id"]] = sku
+    if not skus:
+        abort(json_response(400, HttpText.HTTP_400))
+    return list(skus.values())
+
+
+def update_skus(s: Session, keys: tuple, items: list[dict]) -> dict[int, datetime]:
+    """Update `keys` of many SKUs in one statement.
+
+    Returns the new `updated_at` of every SKU that was updated, which leaves
+    out SKUs that changed since the `updated_at` of their item.
+    """
+
+    sku_values = values(
+        column("id", Integer),
+        column("updated_at", DateTime(timezone=True)),
+        *(column(x, getattr(Sku, x).type) for x in keys),
+        name="sku_values",
+    ).data([(x["id"], x["updated_at"], *(x[y] for y in keys)) for x in items])
+    # Postgres infers the types of a VALUES list from its rows, so cast them
+    updated_at = cast(sku_values.c.updated_at, DateTime(timezone=True))
+    stmt = update(Sku).where(
+        Sku.id == sku_values.c.id,
+        or_(updated_at.is_(None), Sku.updated_at == updated_at),
+    )
+    stmt = stmt.values(
+        {x: cast(sku_values.c[x], getattr(Sku, x).type) for x in keys},
+        updated_at=func.now(),
+    )
+    rows = s.execute(
+        stmt.returning(Sku.id, Sku.updated_at).execution_options(
+            synchronize_session=False
+        )
+    )
+    return {x.id: x.updated_at for x in rows}
+
+
+def join_sku_names() -> ColumnElement[bool]:
+    """Join the stored names of the current locale that have not expired."""
+    expires_at = func.now() - timedelta(seconds=SKU_NAME_TTL_S)
+    return and_(
+        SkuName.sku_id == Sku.id,
+        SkuName.locale == current_locale.locale_posix,
+        SkuName.updated_at > expires_at,
+    )
+
+
+def set_sku_names(s: Session, resources: list[dict]) -> None:
+    """Generate and store the names of SKUs in `resources`."""
+    if not resources:
+        return
+    skus = s.query(Sku).filter(Sku.id.in_([x["id"] for x in resources])).all()
+    names = {x.id: x.name for x in skus}
+    locale = current_locale.locale_posix
+    stmt = insert(SkuName).values(
+        [{"sku_id": k, "locale": locale, "name": v} for k, v in names.items()]
+    )
+    s.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SkuName.sku_id, SkuName.locale],
+            set_={"name": stmt.excluded.name, "updated_at": func.now()},
+        )
+    )
+    for resource in resources:
+        resource["name"] = names[resource["id"]]
@@ -13,6 +13,7 @@ from werkzeug import Response
 from werkzeug.security import generate_password_hash
 
 from bp_api import api_bp
+from bp_api.cache import check_etag, set_etag
 
 #
 # Configuration
@@ -97,9 +98,12 @@ def get_users_id(user_id: int) -> Response:
     api = UserAPI()
     with conn.begin() as s:
         filters = {User.id == current_user.id, User.is_active == true()}
+        etag = check_etag(
+            s.query(User.id, User.updated_at).filter(User.id == user_id, *filters)
+        )
         model: User = api.get(s, user_id, *filters)
         resource = api.gen_resource(s, model)
-    return json_response(data=resource)
+    return set_etag(json_response(data=resource), etag)
 
 
 @api_bp.patch("/users/<int:user_id>")
@@ -6,12 +6,12 @@ from web.app.urls import parse_url, url_for
 from web.database import conn
 from web.database.model import User, Verification
 from web.i18n import _
-from web.mail import mail
 from web.mail.enum import MailEvent
 from web.setup import config
 from werkzeug import Response
 
 from bp_api import api_bp
+from bp_common.outbox import defer_mail_events
 
 #
 # Configuration
@@ -50,7 +50,7 @@ def post_users_id_activation(user_id: int) -> Response:
             _external=True,
             verification_key=verification.key,
         )
-        mail.trigger_events(
+        defer_mail_events(
             s,
             MailEvent.USER_REQUEST_VERIFICATION,
             user.id,
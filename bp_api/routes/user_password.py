@@ -8,13 +8,13 @@ from web.app.urls import parse_url, url_for
 from web.database import conn
 from web.database.model import User, Verification
 from web.i18n import _
-from web.mail import mail
 from web.mail.enum import MailEvent
 from web.setup import config
 from werkzeug import Response
 from werkzeug.security import generate_password_hash
 
 from bp_api import api_bp
+from bp_common.outbox import defer_mail_events
 
 #
 # Configuration
@@ -106,7 +106,7 @@ def recover_user_password(s: Session, data: dict, model: User) -> None:
         _external=True,
         verification_key=verification.key,
     )
-    mail.trigger_events(
+    defer_mail_events(
         s,
         MailEvent.USER_REQUEST_PASSWORD,
         model.id,
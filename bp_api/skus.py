@@ -0,0 +1,31 @@
+from typing import Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from web.database.model import Product, ProductValue, Sku
+from web.utils.generators import gen_slug
+
+from bp_api.models import SkuName
+
+
+def gen_sku_slug(product: Product, values: Iterable[ProductValue]) -> str:
+    """Generate the slug of a new SKU from its product and values.
+
+    Values are ordered by id, so every combination gets one slug regardless
+    of the order of the options.
+    """
+    values = sorted(values, key=lambda x: x.id)
+    return gen_slug("-".join([product.name, *(x.name for x in values)]))
+
+
+def clear_sku_names(s: Session, product_ids: Iterable[int]) -> None:
+    """Remove the stored names of the SKUs of products in all locales.
+
+    Names are regenerated the next time the SKUs are listed.
+    """
+    sku_ids = select(Sku.id).where(Sku.product_id.in_(list(product_ids)))
+    s.execute(
+        delete(SkuName)
+        .where(SkuName.sku_id.in_(sku_ids))
+        .execution_options(synchronize_session=False)
+    )
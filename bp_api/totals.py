@@ -0,0 +1,152 @@
+import json
+
+from sqlalchemy import func, inspect, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.orm import Query, Session
+from web.api import JsonEncoder
+from web.database.model import (
+    Cart,
+    CartItem,
+    Coupon,
+    Currency,
+    Product,
+    ProductValue,
+    Sku,
+    SkuDetail,
+)
+
+from bp_api.cache import gen_weak_etag
+from bp_api.models import CartTotals
+from bp_common.deferral import Deferral
+
+CART_TOTALS_KEYS = [
+    "vat_percentage",
+    "vat_amount",
+    "items_count",
+    "currency_code",
+    "coupon_code",
+    "subtotal_price",
+    "subtotal_price_vat",
+    "discount_price",
+    "discount_price_vat",
+    "shipment_price",
+    "shipment_price_vat",
+    "total_price",
+    "total_price_vat",
+]
+
+
+def defer_cart_totals(s: Session, cart: Cart) -> None:
+    """Store the totals of `cart` right before the transaction of `s` commits.
+
+    Every change within one transaction results in a single recalculation.
+    """
+    cart_totals.pending(s).add(cart)
+
+
+def gen_cart_totals(cart: Cart) -> dict:
+    totals = {x: getattr(cart, x) for x in CART_TOTALS_KEYS}
+    return json.loads(json.dumps(totals, cls=JsonEncoder))
+
+
+def query_cart_versions(s: Session, *filters) -> Query:
+    # Items, SKU prices, names, coupons and currencies change without touching
+    # the cart row itself. Items are hashed rather than summed, so changes
+    # that offset each other still change the version.
+    items_version = func.md5(
+        func.string_agg(
+            func.concat_ws(":", CartItem.sku_id, Sku.unit_price, CartItem.quantity),
+            aggregate_order_by(literal_column("','"), CartItem.id),
+        )
+    )
+    values_updated_at = (
+        select(func.max(ProductValue.updated_at))
+        .join(SkuDetail, SkuDetail.value_id == ProductValue.id)
+        .join(CartItem, CartItem.sku_id == SkuDetail.sku_id)
+        .where(CartItem.cart_id == Cart.id)
+        .correlate(Cart)
+        .scalar_subquery()
+    )
+    return (
+        s.query(
+            Cart.id,
+            Cart.updated_at,
+            items_version,
+            func.max(CartItem.updated_at),
+            func.max(Product.updated_at),
+            values_updated_at,
+            Coupon.updated_at,
+            Coupon.rate,
+            Coupon.amount,
+            Currency.updated_at,
+            Currency.rate,
+        )
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+        .outerjoin(Sku, Sku.id == CartItem.sku_id)
+        .outerjoin(Product, Product.id == Sku.product_id)
+        .outerjoin(Coupon, Coupon.id == Cart.coupon_id)
+        .outerjoin(Currency, Currency.id == Cart.currency_id)
+        .filter(*filters)
+        .group_by(Cart.id, Coupon.id, Currency.id)
+    )
+
+
+def gen_cart_versions(s: Session, carts: list[Cart]) -> dict[int, str]:
+    rows = query_cart_versions(s, Cart.id.in_([x.id for x in carts]))
+    return {x[0]: gen_weak_etag(*x) for x in rows}
+
+
+def set_cart_totals(
+    s: Session,
+    carts: list[Cart],
+    versions: dict[int, str] | None = None,
+) -> dict[int, dict]:
+    """Recalculate and store the totals of `carts` in one statement.
+
+    The totals are stored with the version of the cart they were calculated
+    from, see `query_cart_versions`. The version is selected before the
+    totals are calculated, so totals that raced with a repricing are stored
+    with an outdated version and recalculated on the next read.
+    """
+
+    if not carts:
+        return {}
+    if versions is None:
+        versions = gen_cart_versions(s, carts)
+    totals = {x.id: gen_cart_totals(x) for x in carts}
+    stmt = insert(CartTotals).values(
+        [
+            {"cart_id": k, "totals": v, "version": versions.get(k, "")}
+            for k, v in totals.items()
+        ]
+    )
+    s.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CartTotals.cart_id],
+            set_={
+                "totals": stmt.excluded.totals,
+                "version": stmt.excluded.version,
+                "updated_at": func.now(),
+            },
+        )
+    )
+    return totals
+
+
+def clear_cart_totals(s: Session, *filters) -> None:
+    """Drop the totals of carts matching `filters`.
+
+    They are recalculated the next time the cart is read.
+    """
+    cart_ids = s.query(Cart.id).filter(*filters).scalar_subquery()
+    s.query(CartTotals).filter(CartTotals.cart_id.in_(cart_ids)).delete(
+        synchronize_session=False
+    )
+
+
+def flush_cart_totals(s: Session, carts: set[Cart]) -> None:
+    s.flush()
+    set_cart_totals(s, [x for x in carts if not inspect(x).was_deleted])
+
+
+cart_totals: Deferral[set[Cart]] = Deferral("cart_totals", set, flush_cart_totals)
@@ -0,0 +1,43 @@
+from typing import Callable, Generic, Literal, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+
+class Deferral(Generic[T]):
+    """Work collected on a session and processed when its transaction commits.
+
+    Callers add to the collection returned by `pending`, which is kept in
+    `Session.info` under `key`. It is passed to `process` on `when`, either
+    right before or right after the commit, and discarded on rollback.
+    After the commit the session can not emit SQL anymore, so `process` has
+    to use a new one.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        factory: Callable[[], T],
+        process: Callable[[Session, T], None],
+        when: Literal["before_commit", "after_commit"] = "before_commit",
+    ) -> None:
+        self.key = key
+        self.factory = factory
+        self.process = process
+        event.listen(Session, when, self._process)
+        event.listen(Session, "after_rollback", self._discard)
+
+    def pending(self, s: Session) -> T:
+        if self.key not in s.info:
+            s.info[self.key] = self.factory()
+        return s.info[self.key]
+
+    def _process(self, s: Session) -> None:
+        pending = s.info.pop(self.key, None)
+        if pending:
+            self.process(s, pending)
+
+    def _discard(self, s: Session) -> None:
+        s.info.pop(self.key, None)
@@ -0,0 +1,163 @@
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, current_app
+from flask.ctx import RequestContext
+from sqlalchemy.orm import Session
+from web.database import conn
+from web.database.model import Invoice, Order, Refund
+from web.document.object import gen_invoice_pdf, gen_refund_pdf
+from web.locale import current_locale
+from web.logger import log
+
+# Bump when the invoice or refund templates change to skip cached documents
+PDF_TEMPLATE_VERSION = 1
+PDF_CACHE_DIR = os.path.join(tempfile.gettempdir(), "bp_api", "pdf")
+PDF_CACHE_MAX_FILES = 1000
+# Files used within this window may still be read by a response
+PDF_CACHE_MIN_AGE_S = 300
+
+
+class PdfCache:
+    """Disk cache of rendered PDF documents with LRU eviction.
+
+    Documents are stored under the hash of their key, which doubles as the
+    ETag. The modification time is bumped on every hit and the least recently
+    used files are removed once the cache holds more than `max_files`. Files
+    used within `min_age_s` are kept, since a response may still read them.
+    """
+
+    def __init__(self, dir_: str, max_files: int, min_age_s: int) -> None:
+        self.dir_ = dir_
+        self.max_files = max_files
+        self.min_age_s = min_age_s
+        self._lock = threading.Lock()
+
+    def gen_etag(self, *key: object) -> str:
+        value = ":".join(str(x) for x in (*key, PDF_TEMPLATE_VERSION))
+        return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+    def get(self, etag: str) -> str | None:
+        path = self._gen_path(etag)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, etag: str, pdf) -> str:
+        path = self._gen_path(etag)
+        os.makedirs(self.dir_, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir_, suffix=".tmp")
+        os.close(fd)
+        try:
+            pdf.output(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict()
+        return path
+
+    def _gen_path(self, etag: str) -> str:
+        return os.path.join(self.dir_, f"{etag}.pdf")
+
+    def _evict(self) -> None:
+        with self._lock:
+            paths = glob.glob(os.path.join(self.dir_, "*.pdf"))
+            if len(paths) <= self.max_files:
+                return
+            mtimes = {}
+            for path in paths:
+                try:
+                    mtimes[path] = os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+            threshold = time.time() - self.min_age_s
+            paths = sorted(mtimes, key=mtimes.__getitem__)
+            for path in paths[: len(paths) - self.max_files]:
+                if mtimes[path] > threshold:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_FILES, PDF_CACHE_MIN_AGE_S)
+pdf_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf")
+
+
+def gen_invoice_etag(invoice: Invoice, locale: str) -> str | None:
+    # Invoices can still change until they are paid
+    if invoice.paid_at is None:
+        return None
+    return pdf_cache.gen_etag("invoice", invoice.id, locale)
+
+
+def gen_refund_etag(refund: Refund, locale: str) -> str:
+    return pdf_cache.gen_etag("refund", refund.id, locale)
+
+
+def cache_invoice_pdf(s: Session, order: Order, invoice: Invoice, etag: str) -> str:
+    path = pdf_cache.get(etag)
+    if path is None:
+        pdf = gen_invoice_pdf(s, order, invoice)
+        path = pdf_cache.put(etag, pdf)
+    return path
+
+
+def cache_refund_pdf(
+    s: Session,
+    order: Order,
+    invoice: Invoice,
+    refund: Refund,
+    etag: str,
+) -> str:
+    path = pdf_cache.get(etag)
+    if path is None:
+        pdf = gen_refund_pdf(s, order, invoice, refund)
+        path = pdf_cache.put(etag, pdf)
+    return path
+
+
+def locale_request_context(app: Flask, locale: str | None) -> RequestContext:
+    """Create a request context that resolves `locale`, e.g. "nl_NL".
+
+    Webhooks and queue workers do not carry the locale of the customer, so
+    documents for them are rendered in a context of their own. The default
+    locale is used when `locale` is None.
+    """
+    headers = {}
+    if locale is not None:
+        headers["Accept-Language"] = locale.replace("_", "-")
+    return app.test_request_context(headers=headers)
+
+
+def prerender_invoice_pdf(order_id: int, locale: str | None) -> None:
+    """Render the invoice of an order into the cache in the background.
+
+    The invoice is rendered in `locale`, the locale the order was paid in. It
+    is cached under the locale the context resolves, so a download in that
+    locale is served from the cache.
+    """
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+
+    def render() -> None:
+        try:
+            with locale_request_context(app, locale), conn.begin() as s:
+                order = s.query(Order).filter_by(id=order_id).first()
+                if order is None or order.invoice is None:
+                    return
+                etag = gen_invoice_etag(order.invoice, current_locale.locale_posix)
+                if etag is not None:
+                    cache_invoice_pdf(s, order, order.invoice, etag)
+        except Exception:
+            log.error("Rendering invoice of order %d failed", order_id, exc_info=True)
+
+    pdf_executor.submit(render)
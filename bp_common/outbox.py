@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Session
+from web.database import conn
+from web.logger import log
+from web.mail import mail
+
+from bp_common.deferral import Deferral
+
+
+def defer_mail_events(s: Session, *args, **kwargs) -> None:
+    """Trigger mail events once the transaction of `s` commits.
+
+    Arguments are passed to `mail.trigger_events`. Events are triggered in one
+    batch after the commit and discarded on rollback, so row locks are not
+    held while templates render and mail is queued.
+    """
+    mail_events.pending(s).append((args, kwargs))
+
+
+def flush_mail_events(s: Session, pending: list[tuple]) -> None:
+    # The committed session can not emit SQL anymore, so use a new one
+    with conn.begin() as s_:
+        for args, kwargs in pending:
+            try:
+                with s_.begin_nested():
+                    mail.trigger_events(s_, *args, **kwargs)
+            except Exception:
+                log.error("Mail event %s failed", args[0], exc_info=True)
+
+
+mail_events: Deferral[list[tuple]] = Deferral(
+    "mail_events", list, flush_mail_events, when="after_commit"
+)
@@ -0,0 +1,145 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Any, Sequence
+
+from flask import Flask
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.orm import Session
+from web.database import conn
+from web.logger import log
+
+
+class TableQueue(ABC):
+    """Durable, table-backed queue processed by worker threads.
+
+    The table of `model` needs an `id`, `attempts` and `available_at` column.
+    Workers claim batches of available rows with `FOR UPDATE SKIP LOCKED`. A
+    claim is a lease: rows of crashed workers become available again after
+    `lease_s`. Failed rows are retried with an exponential backoff and are
+    dropped after `max_attempts`.
+
+    Subclasses set `model` and `columns` and implement `process`.
+    """
+
+    name: str
+    model: Any
+    columns: tuple = ()
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int,
+        interval_s: float,
+        lease_s: int,
+        max_attempts: int,
+    ) -> None:
+        self.workers = workers
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid: int | None = None
+
+    def start(self, app: Flask) -> None:
+        with self._lock:
+            # Threads do not survive a fork, so start them once per process
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(app,),
+                    name=f"{self.name}-{i}",
+                    daemon=True,
+                )
+                thread.start()
+
+    def wakeup(self) -> None:
+        self._wakeup.set()
+
+    def drain(self) -> int:
+        count = 0
+        while processed := self.process_batch():
+            count += processed
+        return count
+
+    def process_batch(self) -> int:
+        rows = self.claim()
+        if not rows:
+            return 0
+        results = self.process(rows)
+        self.finish(rows, results)
+        return len(rows)
+
+    def claim(self) -> Sequence[Row]:
+        with conn.begin() as s:
+            next_ids = (
+                select(self.model.id)
+                .where(self.model.available_at <= func.now())
+                .order_by(self.model.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            return s.execute(
+                update(self.model)
+                .where(self.model.id.in_(next_ids))
+                .values(
+                    attempts=self.model.attempts + 1,
+                    available_at=func.now() + timedelta(seconds=self.lease_s),
+                )
+                .returning(self.model.id, self.model.attempts, *self.columns)
+                .execution_options(synchronize_session=False)
+            ).all()
+
+    @abstractmethod
+    def process(self, rows: Sequence[Row]) -> list[bool]:
+        """Process claimed rows and return whether each one succeeded."""
+
+    def complete(self, s: Session, rows: Sequence[Row]) -> None:
+        self.remove(s, rows)
+
+    def remove(self, s: Session, rows: Sequence[Row]) -> None:
+        s.execute(
+            delete(self.model)
+            .where(self.model.id.in_([x.id for x in rows]))
+            .execution_options(synchronize_session=False)
+        )
+
+    def finish(self, rows: Sequence[Row], results: list[bool]) -> None:
+        # Remove processed rows and reschedule failed ones
+        with conn.begin() as s:
+            done = [x for x, ok in zip(rows, results) if ok]
+            dropped = []
+            for row, ok in zip(rows, results):
+                if ok:
+                    continue
+                if row.attempts >= self.max_attempts:
+                    log.error("Row %d of %s dropped", row.id, self.name)
+                    dropped.append(row)
+                    continue
+                delay = timedelta(seconds=self.interval_s * 2**row.attempts)
+                s.execute(
+                    update(self.model)
+                    .where(self.model.id == row.id)
+                    .values(available_at=func.now() + delay)
+                    .execution_options(synchronize_session=False)
+                )
+            if done:
+                self.complete(s, done)
+            if dropped:
+                self.remove(s, dropped)
+
+    def _run(self, app: Flask) -> None:
+        while True:
+            try:
+                with app.app_context():
+                    self.drain()
+            except Exception:
+                log.error("Worker of %s failed", self.name, exc_info=True)
+            self._wakeup.wait(self.interval_s)
+            self._wakeup.clear()
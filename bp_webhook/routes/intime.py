@@ -1,7 +1,23 @@
 import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
 
-from sqlalchemy import false, null
-from sqlalchemy.orm import joinedload
+from flask import request, stream_with_context
+from sqlalchemy import (
+    Integer,
+    String,
+    column,
+    event,
+    false,
+    null,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.orm import ORMExecuteState, Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import get_history
 from web.api import JsonEncoder, json_get
 from web.auth import authorize
 from web.database import conn
@@ -14,10 +30,11 @@ from web.database.model import (
     Sku,
     UserRoleLevel,
 )
-from web.mail import mail
 from web.mail.enum import MailEvent
 from werkzeug import Response
 
+from bp_common.deferral import Deferral
+from bp_common.outbox import defer_mail_events
 from bp_webhook import webhook_bp
 
 #
@@ -28,6 +45,9 @@ from bp_webhook import webhook_bp
 OPEN_ORDER_FILTERS = (Order.status_id == OrderStatusId.READY,)
 SKU_FILTERS = (Sku.number != null(), Sku.is_deleted == false())
 ORDER_FILTERS = (Order.status_id.in_([OrderStatusId.READY, OrderStatusId.COMPLETED]),)
+STREAM_YIELD_PER = 500
+OPEN_ORDERS_MAX_LIMIT = 1000
+COUNT_CACHE_TTL_S = 60
 
 
 def response(code: int = 200, data: list | dict | None = None) -> Response:
@@ -37,6 +57,153 @@ def response(code: int = 200, data: list | dict | None = None) -> Response:
     return Response(value, status=code, mimetype="application/json")
 
 
+def stream_response(key: str, items: Iterable[dict]) -> Response:
+    """Stream `{key: [...]}` as a chunked response.
+
+    Items are encoded one by one and sent in chunks of `STREAM_YIELD_PER`, so
+    memory stays bounded regardless of the number of items.
+    """
+
+    def generate() -> Iterator[str]:
+        yield f"{{{json.dumps(key)}: ["
+        chunk = []
+        for i, item in enumerate(items):
+            value = json.dumps(item, cls=JsonEncoder)
+            chunk.append(value if i == 0 else f",{value}")
+            if len(chunk) >= STREAM_YIELD_PER:
+                yield "".join(chunk)
+                chunk.clear()
+        yield "".join(chunk)
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+class CountCache:
+    """Cache of the filtered counts polled by the warehouse.
+
+    Counts are invalidated after a commit that touches the filtered columns,
+    see `mark_counts` and `clear_counts`. The TTL bounds staleness for writes
+    made by other processes.
+    """
+
+    def __init__(self, ttl_s: int) -> None:
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._counts: dict[str, tuple[int, float]] = {}
+        self._generation = 0
+
+    def get(self, key: str, func: Callable[[], int]) -> int:
+        with self._lock:
+            if key in self._counts:
+                count, counted_at = self._counts[key]
+                if time.monotonic() - counted_at <= self.ttl_s:
+                    self.hits += 1
+                    return count
+            self.misses += 1
+            generation = self._generation
+        count = func()
+        with self._lock:
+            # Skip storing a count that was invalidated while counting
+            if generation == self._generation:
+                self._counts[key] = (count, time.monotonic())
+        return count
+
+    def invalidate(self, *keys: str) -> None:
+        """Drop the counts of `keys`, or all counts when none are given."""
+        with self._lock:
+            self._generation += 1
+            for key in keys or list(self._counts):
+                self._counts.pop(key, None)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+count_cache = CountCache(COUNT_CACHE_TTL_S)
+
+
+def gen_count_keys(cls: type) -> set[str]:
+    if issubclass(cls, Sku):
+        return {"products"}
+    if issubclass(cls, Order):
+        return {"open_orders"}
+    return set()
+
+
+def clear_counts(s: Session, keys: set[str]) -> None:
+    count_cache.invalidate(*keys)
+
+
+count_keys: Deferral[set[str]] = Deferral(
+    "count_keys", set, clear_counts, when="after_commit"
+)
+
+
+@event.listens_for(Session, "after_flush")
+def mark_counts(s: Session, flush_context) -> None:
+    keys = count_keys.pending(s)
+    for obj in s.new | s.deleted:
+        keys |= gen_count_keys(type(obj))
+    for obj in s.dirty:
+        attrs: tuple[str, ...]
+        if isinstance(obj, Sku):
+            attrs = ("number", "is_deleted")
+        elif isinstance(obj, Order):
+            attrs = ("status_id",)
+        else:
+            continue
+        if any(get_history(obj, x).has_changes() for x in attrs):
+            keys |= gen_count_keys(type(obj))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def mark_bulk_counts(state: ORMExecuteState) -> None:
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    if state.bind_mapper is not None:
+        keys = count_keys.pending(state.session)
+        keys |= gen_count_keys(state.bind_mapper.class_)
+
+
+def count_products() -> int:
+    with conn.begin() as s:
+        return s.query(Sku).filter(*SKU_FILTERS).count()
+
+
+def count_open_orders() -> int:
+    with conn.begin() as s:
+        return s.query(Order).filter(*OPEN_ORDER_FILTERS).count()
+
+
+def iter_products() -> Iterator[dict]:
+    with conn.begin() as s:
+        # Fetch skus with a server-side cursor
+        skus = (
+            s.query(Sku)
+            .options(joinedload(Sku.product))
+            .filter(*SKU_FILTERS)
+            .order_by(Sku.id)
+            .yield_per(STREAM_YIELD_PER)
+        )
+        # Serialize skus
+        for sku in skus:
+            yield {
+                "id": str(sku.product_id),
+                "variantId": str(sku.id),
+                "sku": sku.number,
+                "name": sku.name,
+                "createdAt": sku.created_at.isoformat(),
+                "updatedAt": sku.updated_at.isoformat(),
+                "weightInGrams": 0,
+                "unitPrice": sku.unit_price,
+                "stock": sku.stock,
+            }
+
+
 #
 # Routes
 #
@@ -45,34 +212,14 @@ def response(code: int = 200, data: list | dict | None = None) -> Response:
 @webhook_bp.get("/intime/products/count")
 @authorize(UserRoleLevel.EXTERNAL)
 def intime_products_count() -> Response:
-    with conn.begin() as s:
-        count = s.query(Sku).filter(*SKU_FILTERS).count()
+    count = count_cache.get("products", count_products)
     return response(data={"count": count})
 
 
 @webhook_bp.get("/intime/products/list")
 @authorize(UserRoleLevel.EXTERNAL)
 def intime_products_list() -> Response:
-    products = []
-    with conn.begin() as s:
-        # Fetch skus
-        skus = s.query(Sku).options(joinedload(Sku.product)).filter(*SKU_FILTERS).all()
-        # Serialize skus
-        for sku in skus:
-            products.append(
-                {
-                    "id": str(sku.product_id),
-                    "variantId": str(sku.id),
-                    "sku": sku.number,
-                    "name": sku.name,
-                    "createdAt": sku.created_at.isoformat(),
-                    "updatedAt": sku.updated_at.isoformat(),
-                    "weightInGrams": 0,
-                    "unitPrice": sku.unit_price,
-                    "stock": sku.stock,
-                }
-            )
-    return response(data={"products": products})
+    return stream_response("products", iter_products())
 
 
 @webhook_bp.get("/intime/products/<string:sku_number>/stock")
@@ -98,30 +245,109 @@ def intime_products_id(sku_number: str) -> Response:
     return response(data={"hasUpdated": has_updated})
 
 
+@webhook_bp.post("/intime/products/update-stock")
+@authorize(UserRoleLevel.EXTERNAL)
+def intime_products_update_stock() -> Response:
+    # Parse request
+    products, _ = json_get("products", type_=list, nullable=False)
+    stocks: dict[str, int] = {}
+    for product in products:
+        if not isinstance(product, dict):
+            return response(400)
+        number = product.get("sku")
+        stock = product.get("count")
+        if not isinstance(number, str) or not isinstance(stock, int):
+            return response(400)
+        if isinstance(stock, bool):
+            return response(400)
+        stocks[number] = stock
+    if not stocks:
+        return response(data={"products": []})
+
+    with conn.begin() as s:
+        # Fetch existing sku numbers
+        numbers = set(
+            s.scalars(
+                select(Sku.number).filter(Sku.number.in_(stocks), *SKU_FILTERS)
+            ).all()
+        )
+        # Update changed stocks in a single statement
+        stock_values = values(
+            column("number", String),
+            column("stock", Integer),
+            name="stock_values",
+        ).data(list(stocks.items()))
+        updated_numbers = set(
+            s.scalars(
+                update(Sku)
+                .where(
+                    Sku.number == stock_values.c.number,
+                    Sku.stock.is_distinct_from(stock_values.c.stock),
+                    *SKU_FILTERS,
+                )
+                .values(stock=stock_values.c.stock)
+                .returning(Sku.number)
+                .execution_options(synchronize_session=False)
+            ).all()
+        )
+
+    data = [
+        {
+            "sku": number,
+            "isFound": number in numbers,
+            "hasUpdated": number in updated_numbers,
+        }
+        for number in stocks
+    ]
+    return response(data={"products": data})
+
+
 @webhook_bp.get("/intime/open-orders/count")
 @authorize(UserRoleLevel.EXTERNAL)
 def intime_open_orders_count() -> Response:
-    with conn.begin() as s:
-        count = s.query(Order).filter(*OPEN_ORDER_FILTERS).count()
+    count = count_cache.get("open_orders", count_open_orders)
     return response(data={"count": count})
 
 
 @webhook_bp.get("/intime/open-orders/list")
 @authorize(UserRoleLevel.EXTERNAL)
 def intime_open_orders_list() -> Response:
+    # Parse request
+    after_id = request.args.get("after_id", type=int)
+    limit = request.args.get("limit", type=int)
+    updated_since = request.args.get("updated_since", type=datetime.fromisoformat)
+    for key, value in {
+        "after_id": after_id,
+        "limit": limit,
+        "updated_since": updated_since,
+    }.items():
+        if key in request.args and value is None:
+            return response(400)
+    if limit is not None and limit <= 0:
+        return response(400)
+    if limit is not None:
+        limit = min(limit, OPEN_ORDERS_MAX_LIMIT)
+
     open_orders = []
     with conn.begin() as s:
         # Fetch orders
+        filters = [*OPEN_ORDER_FILTERS]
+        if after_id is not None:
+            filters.append(Order.id > after_id)
+        if updated_since is not None:
+            filters.append(Order.updated_at >= updated_since)
         orders = (
             s.query(Order)
             .options(
-                joinedload(Order.lines),
-                joinedload(Order.lines, OrderLine.sku),
-                joinedload(Order.lines, OrderLine.sku, Sku.product),
-                joinedload(Order.shipping),
-                joinedload(Order.shipping, Shipping.country),
+                selectinload(Order.lines),
+                selectinload(Order.lines, OrderLine.sku),
+                selectinload(Order.lines, OrderLine.sku, Sku.product),
+                selectinload(Order.shipping),
+                selectinload(Order.shipping, Shipping.country),
             )
-            .filter(*OPEN_ORDER_FILTERS)
+            .filter(*filters)
+            .order_by(Order.id)
+            .limit(limit)
             .all()
         )
         # Serialize orders
@@ -158,7 +384,18 @@ def intime_open_orders_list() -> Response:
                     ],
                 }
             )
-    return response(data={"openOrders": open_orders})
+    # Return a cursor when more orders may follow
+    if limit is not None and len(orders) == limit:
+        next_after_id = str(orders[-1].id)
+    else:
+        next_after_id = None
+    return response(data={"openOrders": open_orders, "nextAfterId": next_after_id})
+
+
+@webhook_bp.get("/intime/counts/metrics")
+@authorize(UserRoleLevel.ADMIN)
+def intime_counts_metrics() -> Response:
+    return response(data=count_cache.metrics())
 
 
 @webhook_bp.post("/intime/orders/<string:order_id>/update-tracking")
@@ -197,7 +434,7 @@ def intime_orders_id_update_tracking(order_id: str) -> Response:
         has_updated = bool(s.is_modified(order) or s.is_modified(shipment) or s.new)
         # Send emails
         if has_updated:
-            mail.trigger_events(
+            defer_mail_events(
                 s,
                 MailEvent.ORDER_SHIPPED,
                 order.user_id,
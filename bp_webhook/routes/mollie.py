@@ -1,14 +1,179 @@
-from flask import request
+import threading
+from datetime import timedelta
+from typing import Any, Callable, Sequence
+
+from flask import current_app, request
 from mollie.api.error import NotFoundError
+from sqlalchemy import Row, delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
 from web.api import HttpText, json_response
 from web.api.utils.mollie import Mollie
+from web.auth import authorize
 from web.database import conn
-from web.database.model import Invoice, Order, OrderStatusId
-from web.mail import mail
+from web.database.model import Invoice, Order, OrderStatusId, UserRoleLevel
+from web.logger import log
 from web.mail.enum import MailEvent
+from web.setup import config
 from werkzeug import Response
 
+from bp_common.document import prerender_invoice_pdf
+from bp_common.outbox import defer_mail_events
+from bp_common.queue import TableQueue
 from bp_webhook import webhook_bp
+from bp_webhook.models import MollieWebhook
+
+#
+# Configuration
+#
+
+
+class MollieQueue(TableQueue):
+    """Durable queue of Mollie payment ids.
+
+    The webhook only records the payment id, while the workers process the
+    payments, see `TableQueue`. A new row only becomes available after
+    `MOLLIE_DEBOUNCE_S`, so repeated deliveries within that window are folded
+    into one row and processed once.
+    """
+
+    name = "mollie-queue"
+    model = MollieWebhook
+    columns = (MollieWebhook.payment_id, MollieWebhook.version)
+
+    def enqueue(self, mollie_payment_id: str) -> None:
+        debounce_s = getattr(config, "MOLLIE_DEBOUNCE_S", 0.5)
+        with conn.begin() as s:
+            stmt = (
+                insert(MollieWebhook)
+                .values(
+                    payment_id=mollie_payment_id,
+                    available_at=func.now() + timedelta(seconds=debounce_s),
+                )
+                .on_conflict_do_update(
+                    index_elements=[MollieWebhook.payment_id],
+                    # A new delivery gets a fresh set of attempts
+                    set_={"version": MollieWebhook.version + 1, "attempts": 0},
+                )
+            )
+            s.execute(stmt)
+        self.wakeup()
+
+    def process(self, rows: Sequence[Row]) -> list[bool]:
+        results = []
+        for row in rows:
+            try:
+                if not process_payment(row.payment_id):
+                    log.warning("Mollie payment %s has no order", row.payment_id)
+            except Exception:
+                log.error("Mollie payment %s failed", row.payment_id, exc_info=True)
+                results.append(False)
+            else:
+                results.append(True)
+        return results
+
+    def complete(self, s: Session, rows: Sequence[Row]) -> None:
+        for row in rows:
+            # Keep the row when another delivery arrived during processing
+            result = s.execute(
+                delete(MollieWebhook)
+                .where(
+                    MollieWebhook.id == row.id,
+                    MollieWebhook.version == row.version,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                s.execute(
+                    update(MollieWebhook)
+                    .where(MollieWebhook.id == row.id)
+                    .values(available_at=func.now())
+                    .execution_options(synchronize_session=False)
+                )
+
+
+mollie_queue = MollieQueue(
+    workers=2, batch_size=1, interval_s=5, lease_s=300, max_attempts=10
+)
+
+
+@webhook_bp.record_once
+def start_mollie_queue(state) -> None:
+    if getattr(config, "MOLLIE_QUEUE_ENABLED", False):
+        mollie_queue.start(state.app)
+
+
+class Flight:
+    def __init__(self, previous: "Flight | None") -> None:
+        self.previous = previous
+        self.started = False
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class Coalescer:
+    """Fold concurrent deliveries of the same key into one call.
+
+    A delivery that arrives while the call is running starts one trailing
+    call after it, since it may carry a newer payment status. Deliveries that
+    arrive before the trailing call has started share its result.
+    """
+
+    def __init__(self) -> None:
+        self.deliveries = 0
+        self.folded = 0
+        self._lock = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+
+    def run(self, key: str, func: Callable[[str], Any]) -> Any:
+        with self._lock:
+            self.deliveries += 1
+            flight = self._flights.get(key)
+            if flight is not None and not flight.started:
+                self.folded += 1
+                is_leader = False
+            else:
+                flight = Flight(flight)
+                self._flights[key] = flight
+                is_leader = True
+
+        if is_leader:
+            self._lead(key, flight, func)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"deliveries": self.deliveries, "folded": self.folded}
+
+    def _lead(self, key: str, flight: Flight, func: Callable[[str], Any]) -> None:
+        if flight.previous is not None:
+            flight.previous.done.wait()
+        with self._lock:
+            flight.started = True
+            flight.previous = None
+        try:
+            flight.result = func(key)
+        except BaseException as error:
+            flight.error = error
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+
+mollie_coalescer = Coalescer()
+
+
+#
+# Endpoints
+#
 
 
 @webhook_bp.post("/mollie/payment")
@@ -18,23 +183,55 @@ def mollie_payment() -> Response:
     A 200 OK response is returned if the payment is processed or when it is
     unknown to the system. The latter is recommended by Mollie for security
     reasons: https://docs.mollie.com/overview/webhooks.
+
+    When `MOLLIE_QUEUE_ENABLED` is set, the payment id is only queued and the
+    payment is processed by the workers of `mollie_queue`. Otherwise repeated
+    deliveries are folded by `mollie_coalescer`.
     """
 
     mollie_payment_id = request.form.get("id")
     if not mollie_payment_id:
         return json_response()
 
+    if getattr(config, "MOLLIE_QUEUE_ENABLED", False):
+        mollie_queue.start(current_app._get_current_object())  # type: ignore[attr-defined]
+        mollie_queue.enqueue(mollie_payment_id)
+        return json_response()
+
+    if not mollie_coalescer.run(mollie_payment_id, process_payment):
+        return json_response(404, HttpText.HTTP_404)
+    return json_response()
+
+
+@webhook_bp.get("/mollie/metrics")
+@authorize(UserRoleLevel.ADMIN)
+def mollie_metrics() -> Response:
+    return json_response(data=mollie_coalescer.metrics())
+
+
+#
+# Functions
+#
+
+
+def process_payment(mollie_payment_id: str) -> bool:
+    """Update the invoice and order status of a Mollie payment.
+
+    Returns False when the payment refers to an unknown order.
+    """
+
     mollie = Mollie()
     try:
         mollie_payment_ = mollie.payments.get(mollie_payment_id)
     except NotFoundError:
-        return json_response()
+        return True
 
+    paid_order_id = None
     with conn.begin() as s:
         order_id = mollie_payment_.metadata.get("order_id")
         order = s.query(Order).filter_by(id=order_id).first()
         if not order:
-            return json_response(404, HttpText.HTTP_404)
+            return False
 
         if mollie_payment_.is_paid():
             invoice = s.query(Invoice).filter_by(order_id=order_id).first()
@@ -53,8 +250,9 @@ def mollie_payment() -> Response:
 
             if order.status_id != OrderStatusId.PAID:
                 order.status_id = OrderStatusId.PAID
+                paid_order_id = order.id
                 s.flush()
-                mail.trigger_events(
+                defer_mail_events(
                     s,
                     MailEvent.ORDER_PAID,
                     order.user_id,
@@ -62,4 +260,9 @@ def mollie_payment() -> Response:
                     billing_email=order.billing.email,
                 )
 
-    return json_response()
+    # Invoices are immutable once paid, so render it ahead of the download
+    if paid_order_id is not None:
+        # The payment holds the locale the order was placed in
+        prerender_invoice_pdf(paid_order_id, mollie_payment_.locale)
+
+    return True
@@ -27,6 +27,13 @@ setup(
     include_package_data=True,
     package_data={"": DATA},
     packages=find_packages(
-        include=["bp_api", "bp_api.*", "bp_webhook", "bp_webhook.*"]
+        include=[
+            "bp_api",
+            "bp_api.*",
+            "bp_common",
+            "bp_common.*",
+            "bp_webhook",
+            "bp_webhook.*",
+        ]
     ),
 )
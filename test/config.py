@@ -80,6 +80,9 @@ CDN_AUTO_NAMING = False
 CDN_IMAGE_EXTS = ["jpg", "jpeg", "png", "webp"]
 CDN_AUDIO_EXTS = ["m4a", "mp3", "mp4"]
 CDN_VIDEO_EXTS = ["mp4"]
+CDN_IMAGE_SIZES = [480, 960, 1920]
+CDN_IMAGE_FORMATS = ["webp", "avif"]
+CDN_DELETE_QUEUE_ENABLED = False
 
 FTP_HOSTNAME = env_var("FTP_HOSTNAME", str)
 FTP_USERNAME = env_var("FTP_USERNAME", str)
@@ -94,6 +97,8 @@ GOOGLE_CLIENT_ID = None
 GOOGLE_PLACE_ID = None
 
 MOLLIE_API_KEY = None
+MOLLIE_QUEUE_ENABLED = False
+MOLLIE_DEBOUNCE_S = 0
 
 INTIME_ENABLED = False
 
@@ -11,7 +11,11 @@ from web.setup.server import Server
 
 import test.config as config
 from bp_api import api_bp
+from bp_api.cache import response_cache
+from bp_api.routes.cart import vat_cache
+from bp_api.routes.shipment_method import shipment_index
 from bp_webhook import webhook_bp
+from bp_webhook.routes.intime import count_cache
 
 from .tasks import UserSeedSyncer
 
@@ -38,6 +42,15 @@ def drop_tables():
     engine.dispose()
 
 
+@pytest.fixture(scope="function", autouse=True)
+def clear_indexes(drop_tables):
+    log.debug("Clearing indexes")
+    shipment_index.invalidate()
+    response_cache.invalidate()
+    vat_cache.invalidate()
+    count_cache.invalidate()
+
+
 @pytest.fixture(scope="function", autouse=True)
 def client(drop_tables):
     app = Flask(__name__)
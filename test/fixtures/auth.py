@@ -11,6 +11,11 @@ def user_auth():
     return {"Authorization": "Bearer user"}
 
 
+@pytest.fixture(scope="session")
+def external_auth():
+    return {"Authorization": "Bearer external"}
+
+
 @pytest.fixture(scope="session")
 def admin_auth():
     return {"Authorization": "Bearer admin"}
@@ -105,3 +105,115 @@ def add_coupon_10perc(client):
         s.add(obj)
     cache_manager.update(force=True)
     return obj
+
+
+#
+# Product
+#
+
+
+@pytest.fixture(scope="function")
+def add_product(client):
+    with conn.begin() as s:
+        product = m.Product(
+            type_id=m.ProductTypeId.PHYSICAL,
+            name="Test Product",
+            unit_price=10,
+        )
+        s.add(product)
+    return product
+
+
+@pytest.fixture(scope="function")
+def add_product_values(client, add_product):
+    with conn.begin() as s:
+        options = [
+            m.ProductOption(product_id=add_product.id, name="Color", order=1),
+            m.ProductOption(product_id=add_product.id, name="Size", order=2),
+        ]
+        s.add_all(options)
+        s.flush()
+        values = [
+            m.ProductValue(option_id=options[0].id, name="Red", unit_price=12),
+            m.ProductValue(option_id=options[0].id, name="Blue"),
+            m.ProductValue(option_id=options[1].id, name="Small"),
+            m.ProductValue(option_id=options[1].id, name="Large", unit_price=15),
+        ]
+        s.add_all(values)
+    return values
+
+
+#
+# Sku
+#
+
+
+@pytest.fixture(scope="function")
+def add_skus(client, add_product):
+    with conn.begin() as s:
+        skus = [
+            m.Sku(
+                product_id=add_product.id,
+                slug=f"test-product-{i}",
+                stock=1,
+                is_visible=True,
+                unit_price=10,
+            )
+            for i in range(1, 6)
+        ]
+        s.add_all(skus)
+    return skus
+
+
+#
+# Order
+#
+
+
+@pytest.fixture(scope="function")
+def add_orders(client, user_auth, add_country_nl, add_skus):
+    with conn.begin() as s:
+        s.get(m.Country, add_country_nl.id).allows_shipping = True
+
+    address_data = {
+        "address": "123 Test Street",
+        "city": "Amsterdam",
+        "country_id": add_country_nl.id,
+        "email": "test@example.com",
+        "first_name": "John",
+        "last_name": "Doe",
+        "zip_code": "1012AB",
+    }
+    resp = client.post("/api/v1/billings", headers=user_auth, json=address_data)
+    assert resp.status_code == 200
+    billing_id = resp.json["data"]["id"]
+    resp = client.post("/api/v1/shippings", headers=user_auth, json=address_data)
+    assert resp.status_code == 200
+    shipping_id = resp.json["data"]["id"]
+
+    order_ids = []
+    for sku in add_skus[:3]:
+        resp = client.post("/api/v1/carts", headers=user_auth, json={})
+        assert resp.status_code == 200
+        cart_id = resp.json["data"]["id"]
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": sku.id, "quantity": 1},
+        )
+        assert resp.status_code == 200
+        resp = client.patch(
+            f"/api/v1/carts/{cart_id}",
+            headers=user_auth,
+            json={"billing_id": billing_id, "shipping_id": shipping_id},
+        )
+        assert resp.status_code == 200
+        resp = client.post(
+            "/api/v1/orders",
+            headers=user_auth,
+            json={"cart_id": cart_id, "trigger_mail": False},
+        )
+        assert resp.status_code == 200
+        order_ids.append(resp.json["data"]["id"])
+
+    return order_ids
@@ -1,6 +1,29 @@
+import contextlib
+from types import SimpleNamespace
+
 import pytest
+from sqlalchemy import event
+from web.database.client import engine
 
 
 @pytest.fixture(scope="session")
 def INVALID_ID():
     return 999999
+
+
+@pytest.fixture(scope="function")
+def count_statements():
+    @contextlib.contextmanager
+    def _count():
+        counter = SimpleNamespace(count=0)
+
+        def before_cursor_execute(*args, **kwargs):
+            counter.count += 1
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return _count
@@ -18,6 +18,12 @@ class UserSeedSyncer(SeedSyncer):
             is_active=True,
             role_id=UserRoleId.USER,
         ),
+        User(
+            api_key="external",
+            email="external@esherpa.io",
+            is_active=True,
+            role_id=UserRoleId.EXTERNAL,
+        ),
         User(
             api_key="admin",
             email="admin@esherpa.io",
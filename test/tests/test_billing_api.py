@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 import pytest
 
+from bp_api.routes import cart
+
 
 class TestBillingAPI:
     #
@@ -193,3 +197,60 @@ class TestBillingAPI:
             json={"country_id": INVALID_ID},
         )
         assert resp.status_code == 409
+
+    def test_patch_billings_id_carts(
+        self, client, user_auth, billing_data, add_country_uk, add_skus, monkeypatch
+    ):
+        vat_rates = {"NL": Decimal("0.21"), "GB": Decimal("0.20")}
+        monkeypatch.setattr(
+            cart, "get_vat", lambda code, is_business: (vat_rates[code], False)
+        )
+
+        def post_cart(billing_id):
+            resp = client.post("/api/v1/carts", headers=user_auth, json={})
+            assert resp.status_code == 200
+            cart_id = resp.json["data"]["id"]
+            resp = client.post(
+                f"/api/v1/carts/{cart_id}/items",
+                headers=user_auth,
+                json={"sku_id": add_skus[0].id, "quantity": 2},
+            )
+            assert resp.status_code == 200
+            resp = client.patch(
+                f"/api/v1/carts/{cart_id}",
+                headers=user_auth,
+                json={"billing_id": billing_id},
+            )
+            assert resp.status_code == 200
+            return cart_id
+
+        resp = client.post("/api/v1/billings", headers=user_auth, json=billing_data)
+        assert resp.status_code == 200
+        billing_id = resp.json["data"]["id"]
+        cart_id = post_cart(billing_id)
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        assert Decimal(str(resp.json["data"]["vat_rate"])) == vat_rates["NL"]
+
+        # Carts of the billing are updated in bulk
+        resp = client.patch(
+            f"/api/v1/billings/{billing_id}",
+            headers=user_auth,
+            json={"company": None, "country_id": add_country_uk.id, "vat": None},
+        )
+        assert resp.status_code == 200
+
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        data = resp.json["data"]
+        assert Decimal(str(data["vat_rate"])) == vat_rates["GB"]
+        assert data["currency_id"] == add_country_uk.currency_id
+        assert data["currency_code"] == "GBP"
+
+        # The result matches a cart that is updated on its own
+        other_cart_id = post_cart(billing_id)
+        other_resp = client.get(f"/api/v1/carts/{other_cart_id}", headers=user_auth)
+        assert other_resp.status_code == 200
+        other_data = other_resp.json["data"]
+        assert data.pop("id") != other_data.pop("id")
+        assert data == other_data
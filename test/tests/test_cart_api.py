@@ -1,4 +1,12 @@
+from decimal import Decimal
+
 import pytest
+from sqlalchemy import update
+from web.database import conn
+from web.database.model import Currency, Product, Sku
+
+from bp_api.models import CartTotals
+from bp_api.routes import cart
 
 
 class TestCartAPI:
@@ -34,6 +42,27 @@ class TestCartAPI:
             "zip_code": "3512AB",
         }
 
+    @pytest.fixture(scope="function")
+    def cart_id(self, client, user_auth, add_country_nl, add_skus):
+        resp = client.post("/api/v1/carts", headers=user_auth, json={})
+        assert resp.status_code == 200
+        cart_id = resp.json["data"]["id"]
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[0].id, "quantity": 2},
+        )
+        assert resp.status_code == 200
+        return cart_id
+
+    @pytest.fixture(scope="function")
+    def vat_rates(self, monkeypatch):
+        rates = {"NL": Decimal("0.21"), "GB": Decimal("0.20")}
+        monkeypatch.setattr(
+            cart, "get_vat", lambda code, is_business: (rates[code], False)
+        )
+        return rates
+
     #
     # Tests
     #
@@ -92,6 +121,37 @@ class TestCartAPI:
         assert "subtotal_price" in data
         assert "total_price" in data
 
+    def test_get_carts_id_not_modified(self, client, user_auth, add_country_nl):
+        post_resp = client.post("/api/v1/carts", headers=user_auth, json={})
+        assert post_resp.status_code == 200
+
+        cart_id = post_resp.json["data"]["id"]
+        get_resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert get_resp.status_code == 200
+        etag = get_resp.headers["ETag"]
+        assert etag.startswith("W/")
+
+        assert "Accept-Language" in get_resp.vary
+
+        headers = {**user_auth, "If-None-Match": etag}
+        get_resp = client.get(f"/api/v1/carts/{cart_id}", headers=headers)
+        assert get_resp.status_code == 304
+        assert "Accept-Language" in get_resp.vary
+
+    def test_get_carts_id_renamed(self, client, user_auth, add_product, cart_id):
+        resp = client.get(f"/api/v1/carts/{cart_id}/items", headers=user_auth)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        # Renames change the names of the items, but not the cart itself
+        with conn.begin() as s:
+            s.get(Product, add_product.id).name = "Renamed Product"
+
+        headers = {**user_auth, "If-None-Match": etag}
+        resp = client.get(f"/api/v1/carts/{cart_id}/items", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
     def test_get_carts_id_not_found(self, client, user_auth, INVALID_ID):
         get_resp = client.get(f"/api/v1/carts/{INVALID_ID}", headers=user_auth)
         assert get_resp.status_code == 404
@@ -237,3 +297,144 @@ class TestCartAPI:
             headers=admin_auth,
         )
         assert del_cart_resp.status_code == 404
+
+    def test_get_carts_id_repriced(
+        self, client, user_auth, admin_auth, add_product, cart_id
+    ):
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        subtotal_price = resp.json["data"]["subtotal_price"]
+
+        data = {"products": [{"id": add_product.id, "unit_price": 20}]}
+        resp = client.patch("/api/v1/products/prices", headers=admin_auth, json=data)
+        assert resp.status_code == 200
+
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        assert resp.json["data"]["subtotal_price"] != subtotal_price
+
+    def test_get_carts_id_outdated_totals(self, client, user_auth, add_skus, cart_id):
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        subtotal_price = resp.json["data"]["subtotal_price"]
+
+        # Reprice without dropping the stored totals, like a lost race
+        with conn.begin() as s:
+            s.execute(update(Sku).where(Sku.id == add_skus[0].id).values(unit_price=20))
+            assert s.query(CartTotals).count() == 1
+
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        data = resp.json["data"]
+        assert data["subtotal_price"] != subtotal_price
+
+        # The recalculated totals match totals calculated from scratch
+        with conn.begin() as s:
+            s.query(CartTotals).delete()
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.json["data"] == data
+
+    def test_get_carts_id_offsetting_reprice(
+        self, client, user_auth, add_skus, cart_id
+    ):
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[1].id, "quantity": 1},
+        )
+        assert resp.status_code == 200
+        resp = client.get(f"/api/v1/carts/{cart_id}/items", headers=user_auth)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        # Repricing that keeps the sum of the items still changes the version
+        with conn.begin() as s:
+            s.execute(update(Sku).where(Sku.id == add_skus[0].id).values(unit_price=9))
+            s.execute(update(Sku).where(Sku.id == add_skus[1].id).values(unit_price=12))
+
+        headers = {**user_auth, "If-None-Match": etag}
+        resp = client.get(f"/api/v1/carts/{cart_id}/items", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+    def test_get_carts_id_currency_rate(
+        self, client, user_auth, add_currency_eur, cart_id
+    ):
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        with conn.begin() as s:
+            s.execute(
+                update(Currency)
+                .where(Currency.id == add_currency_eur.id)
+                .values(rate=2)
+            )
+
+        headers = {**user_auth, "If-None-Match": etag}
+        resp = client.get(f"/api/v1/carts/{cart_id}", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+    def test_patch_carts_id_vat_cached(
+        self,
+        client,
+        user_auth,
+        billing_data_minimal,
+        add_country_uk,
+        cart_id,
+        vat_rates,
+    ):
+        def patch_cart(data):
+            resp = client.patch(
+                f"/api/v1/carts/{cart_id}", headers=user_auth, json=data
+            )
+            assert resp.status_code == 200
+            return Decimal(str(resp.json["data"]["vat_rate"]))
+
+        uk_data = {**billing_data_minimal, "country_id": add_country_uk.id}
+        resp = client.post("/api/v1/shippings", headers=user_auth, json=uk_data)
+        assert resp.status_code == 200
+        shipping_id = resp.json["data"]["id"]
+        addresses = []
+        for data in [billing_data_minimal, uk_data]:
+            resp = client.post("/api/v1/billings", headers=user_auth, json=data)
+            assert resp.status_code == 200
+            addresses.append(resp.json["data"]["id"])
+
+        # Every change of address is looked up, even after a cached lookup
+        assert patch_cart({"shipping_id": shipping_id}) == vat_rates["GB"]
+        assert patch_cart({"billing_id": addresses[0]}) == vat_rates["NL"]
+        assert patch_cart({"billing_id": addresses[1]}) == vat_rates["GB"]
+        assert patch_cart({"billing_id": addresses[0]}) == vat_rates["NL"]
+
+    def test_patch_carts_id_vat_country_changed(
+        self,
+        client,
+        user_auth,
+        admin_auth,
+        billing_data_minimal,
+        add_country_nl,
+        cart_id,
+        vat_rates,
+    ):
+        resp = client.post(
+            "/api/v1/billings", headers=user_auth, json=billing_data_minimal
+        )
+        assert resp.status_code == 200
+        data = {"billing_id": resp.json["data"]["id"]}
+        resp = client.patch(f"/api/v1/carts/{cart_id}", headers=user_auth, json=data)
+        assert resp.status_code == 200
+        assert Decimal(str(resp.json["data"]["vat_rate"])) == vat_rates["NL"]
+
+        # Country changes drop the cached lookups
+        vat_rates["NL"] = Decimal("0.09")
+        resp = client.patch(
+            f"/api/v1/countries/{add_country_nl.id}",
+            headers=admin_auth,
+            json={"requires_billing_vat": True},
+        )
+        assert resp.status_code == 200
+        resp = client.patch(f"/api/v1/carts/{cart_id}", headers=user_auth, json=data)
+        assert resp.status_code == 200
+        assert Decimal(str(resp.json["data"]["vat_rate"])) == vat_rates["NL"]
@@ -0,0 +1,260 @@
+import pytest
+
+
+class TestCartItemAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def cart_id(self, client, user_auth, add_country_nl):
+        resp = client.post("/api/v1/carts", headers=user_auth, json={})
+        assert resp.status_code == 200
+        return resp.json["data"]["id"]
+
+    #
+    # Tests
+    #
+
+    def test_post_carts_id_items_success(self, client, user_auth, cart_id, add_skus):
+        sku_id = add_skus[0].id
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": sku_id, "quantity": 2},
+        )
+        assert resp.status_code == 200
+
+        data = resp.json["data"]
+        assert data["cart_id"] == cart_id
+        assert data["sku_id"] == sku_id
+        assert data["quantity"] == 2
+
+    def test_post_carts_id_items_existing_sku(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        sku_id = add_skus[0].id
+        for _ in range(2):
+            resp = client.post(
+                f"/api/v1/carts/{cart_id}/items",
+                headers=user_auth,
+                json={"sku_id": sku_id, "quantity": 1},
+            )
+            assert resp.status_code == 200
+        assert resp.json["data"]["quantity"] == 2
+
+        get_resp = client.get(f"/api/v1/carts/{cart_id}/items", headers=user_auth)
+        assert get_resp.status_code == 200
+        assert len(get_resp.json["data"]) == 1
+
+    def test_post_carts_id_items_not_found(
+        self, client, user_auth, add_skus, INVALID_ID
+    ):
+        resp = client.post(
+            f"/api/v1/carts/{INVALID_ID}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[0].id},
+        )
+        assert resp.status_code == 404
+
+    def test_get_carts_id_items_different_user(
+        self, client, admin_auth, cart_id, add_skus
+    ):
+        resp = client.get(f"/api/v1/carts/{cart_id}/items", headers=admin_auth)
+        assert resp.status_code == 404
+
+    def test_post_carts_id_items_constant_statements(
+        self, client, user_auth, cart_id, add_skus, count_statements
+    ):
+        counts = []
+        for sku in add_skus:
+            with count_statements() as counter:
+                resp = client.post(
+                    f"/api/v1/carts/{cart_id}/items",
+                    headers=user_auth,
+                    json={"sku_id": sku.id},
+                )
+            assert resp.status_code == 200
+            counts.append(counter.count)
+        assert len(set(counts[1:])) == 1
+
+    def test_patch_cart_id_items_id_success(self, client, user_auth, cart_id, add_skus):
+        post_resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[0].id},
+        )
+        assert post_resp.status_code == 200
+
+        cart_item_id = post_resp.json["data"]["id"]
+        patch_resp = client.patch(
+            f"/api/v1/carts/{cart_id}/items/{cart_item_id}",
+            headers=user_auth,
+            json={"quantity": 3},
+        )
+        assert patch_resp.status_code == 200
+        assert patch_resp.json["data"]["quantity"] == 3
+
+    def test_patch_cart_id_items_id_quantity_zero(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        post_resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[0].id},
+        )
+        assert post_resp.status_code == 200
+
+        cart_item_id = post_resp.json["data"]["id"]
+        patch_resp = client.patch(
+            f"/api/v1/carts/{cart_id}/items/{cart_item_id}",
+            headers=user_auth,
+            json={"quantity": 0},
+        )
+        assert patch_resp.status_code == 400
+
+    def test_patch_cart_id_items_id_not_found(
+        self, client, user_auth, cart_id, INVALID_ID
+    ):
+        patch_resp = client.patch(
+            f"/api/v1/carts/{cart_id}/items/{INVALID_ID}",
+            headers=user_auth,
+            json={"quantity": 1},
+        )
+        assert patch_resp.status_code == 404
+
+    def test_delete_cart_id_items_id_success(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        post_resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[0].id},
+        )
+        assert post_resp.status_code == 200
+
+        cart_item_id = post_resp.json["data"]["id"]
+        delete_resp = client.delete(
+            f"/api/v1/carts/{cart_id}/items/{cart_item_id}",
+            headers=user_auth,
+        )
+        assert delete_resp.status_code == 200
+
+        get_resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert get_resp.status_code == 200
+        assert get_resp.json["data"]["items_count"] == 0
+
+    def test_post_carts_id_items_batch_success(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        items = [{"sku_id": x.id, "quantity": 2} for x in add_skus]
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": items},
+        )
+        assert resp.status_code == 200
+
+        data = resp.json["data"]
+        assert [x["sku_id"] for x in data] == [x.id for x in add_skus]
+        assert all(x["quantity"] == 2 for x in data)
+
+        get_resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert get_resp.status_code == 200
+        assert get_resp.json["data"]["items_count"] == 2 * len(add_skus)
+
+    def test_post_carts_id_items_batch_existing_sku(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        sku_id = add_skus[0].id
+        items = [{"sku_id": sku_id}, {"sku_id": sku_id, "quantity": 2}]
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": items},
+        )
+        assert resp.status_code == 200
+
+        data = resp.json["data"]
+        assert len(data) == 1
+        assert data[0]["quantity"] == 3
+
+    def test_post_carts_id_items_batch_invalid(self, client, user_auth, cart_id):
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": [{"quantity": 1}]},
+        )
+        assert resp.status_code == 400
+
+    @pytest.mark.parametrize("sku_id", [True, "1"])
+    def test_post_carts_id_items_batch_invalid_sku_id(
+        self, client, user_auth, cart_id, add_skus, sku_id
+    ):
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": [{"sku_id": sku_id}]},
+        )
+        assert resp.status_code == 400
+
+    def test_post_carts_id_items_batch_unknown_sku(
+        self, client, user_auth, admin_auth, cart_id, add_skus, INVALID_ID
+    ):
+        items = [{"sku_id": add_skus[0].id}, {"sku_id": INVALID_ID}]
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": items},
+        )
+        assert resp.status_code == 404
+
+        # Deleted skus can not be added either
+        resp = client.delete(f"/api/v1/skus/{add_skus[1].id}", headers=admin_auth)
+        assert resp.status_code == 200
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": [{"sku_id": add_skus[1].id}]},
+        )
+        assert resp.status_code == 404
+
+        get_resp = client.get(f"/api/v1/carts/{cart_id}", headers=user_auth)
+        assert get_resp.status_code == 200
+        assert get_resp.json["data"]["items_count"] == 0
+
+    def test_patch_carts_id_items_batch_success(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        items = [{"sku_id": x.id, "quantity": 2} for x in add_skus]
+        post_resp = client.post(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": items},
+        )
+        assert post_resp.status_code == 200
+
+        items = [{"sku_id": x.id, "quantity": 1} for x in add_skus]
+        patch_resp = client.patch(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": items},
+        )
+        assert patch_resp.status_code == 200
+        assert all(x["quantity"] == 1 for x in patch_resp.json["data"])
+
+    def test_patch_carts_id_items_batch_existing_sku(
+        self, client, user_auth, cart_id, add_skus
+    ):
+        sku_id = add_skus[0].id
+        items = [{"sku_id": sku_id, "quantity": 2}, {"sku_id": sku_id}]
+        resp = client.patch(
+            f"/api/v1/carts/{cart_id}/items:batch",
+            headers=user_auth,
+            json={"items": items},
+        )
+        assert resp.status_code == 200
+
+        data = resp.json["data"]
+        assert len(data) == 1
+        assert data[0]["quantity"] == 1
@@ -0,0 +1,76 @@
+from bp_api.cache import response_cache
+
+
+class TestCountryAPI:
+    #
+    # Tests
+    #
+
+    def test_get_countries_cached(self, client, add_country_nl, count_statements):
+        resp = client.get("/api/v1/countries")
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        with count_statements() as counter:
+            cached_resp = client.get("/api/v1/countries")
+        assert counter.count == 0
+        assert cached_resp.status_code == 200
+        assert cached_resp.data == resp.data
+        assert cached_resp.headers == resp.headers
+
+        resp = client.get("/api/v1/countries", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.headers["ETag"] == etag
+
+    def test_get_countries_unknown_args(self, client, add_country_nl, count_statements):
+        # Arbitrary query strings are not cached
+        for _ in range(2):
+            with count_statements() as counter:
+                resp = client.get("/api/v1/countries?x=0")
+            assert resp.status_code == 200
+            assert counter.count > 0
+
+    def test_get_countries_invalidated(self, client, admin_auth, add_country_nl):
+        resp = client.get(f"/api/v1/countries/{add_country_nl.id}")
+        assert resp.status_code == 200
+        assert not resp.json["data"]["allows_shipping"]
+
+        resp = client.patch(
+            f"/api/v1/countries/{add_country_nl.id}",
+            headers=admin_auth,
+            json={"allows_shipping": True},
+        )
+        assert resp.status_code == 200
+
+        resp = client.get(f"/api/v1/countries/{add_country_nl.id}")
+        assert resp.status_code == 200
+        assert resp.json["data"]["allows_shipping"] is True
+
+    def test_get_countries_expired(
+        self, client, add_country_nl, count_statements, monkeypatch
+    ):
+        resp = client.get("/api/v1/countries")
+        assert resp.status_code == 200
+
+        monkeypatch.setattr(response_cache, "ttl_s", -1)
+        with count_statements() as counter:
+            resp = client.get("/api/v1/countries")
+        assert resp.status_code == 200
+        assert counter.count > 0
+
+    def test_get_countries_evicted(
+        self, client, add_country_nl, count_statements, monkeypatch
+    ):
+        monkeypatch.setattr(response_cache, "max_entries", 1)
+        resp = client.get("/api/v1/countries")
+        assert resp.status_code == 200
+        resp = client.get(f"/api/v1/countries/{add_country_nl.id}")
+        assert resp.status_code == 200
+
+        # The least recently used entry is evicted
+        with count_statements() as counter:
+            resp = client.get(f"/api/v1/countries/{add_country_nl.id}")
+        assert counter.count == 0
+        with count_statements() as counter:
+            resp = client.get("/api/v1/countries")
+        assert counter.count > 0
@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from web.database import conn
+from web.database import model as m
+
+
+class TestIntimeOrdersAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def add_orders(self, add_orders):
+        with conn.begin() as s:
+            s.query(m.Order).update({m.Order.status_id: m.OrderStatusId.READY})
+        return add_orders
+
+    @pytest.fixture(scope="function")
+    def get_open_orders(self, client, external_auth):
+        def get_open_orders(query_string=""):
+            resp = client.get(
+                f"/webhook/v1/intime/open-orders/list{query_string}",
+                headers=external_auth,
+            )
+            assert resp.status_code == 200
+            return json.loads(resp.get_data(as_text=True))
+
+        return get_open_orders
+
+    #
+    # Tests
+    #
+
+    def test_get_intime_open_orders_list_success(self, add_orders, get_open_orders):
+        data = get_open_orders()
+        assert [int(x["id"]) for x in data["openOrders"]] == add_orders
+        assert data["nextAfterId"] is None
+
+    def test_get_intime_open_orders_list_paginated(self, add_orders, get_open_orders):
+        data = get_open_orders("?limit=2")
+        assert [int(x["id"]) for x in data["openOrders"]] == add_orders[:2]
+        assert data["nextAfterId"] == str(add_orders[1])
+
+        data = get_open_orders(f"?limit=2&after_id={data['nextAfterId']}")
+        assert [int(x["id"]) for x in data["openOrders"]] == add_orders[2:]
+        assert data["nextAfterId"] is None
+
+    def test_get_intime_open_orders_list_updated_since(
+        self, add_orders, get_open_orders
+    ):
+        with conn.begin() as s:
+            order = s.get(m.Order, add_orders[0])
+            order.updated_at = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+        data = get_open_orders("?updated_since=2020-01-01T00:00:00%2B00:00")
+        assert [int(x["id"]) for x in data["openOrders"]] == add_orders[1:]
+
+    @pytest.mark.parametrize(
+        "query_string", ["?limit=0", "?limit=x", "?after_id=x", "?updated_since=x"]
+    )
+    def test_get_intime_open_orders_list_invalid(
+        self, client, external_auth, query_string
+    ):
+        resp = client.get(
+            f"/webhook/v1/intime/open-orders/list{query_string}",
+            headers=external_auth,
+        )
+        assert resp.status_code == 400
+
+    def test_get_intime_open_orders_count_invalidated(
+        self, client, external_auth, add_orders
+    ):
+        def get_count():
+            resp = client.get(
+                "/webhook/v1/intime/open-orders/count", headers=external_auth
+            )
+            assert resp.status_code == 200
+            return json.loads(resp.get_data(as_text=True))["count"]
+
+        assert get_count() == 3
+        resp = client.post(
+            f"/webhook/v1/intime/orders/{add_orders[0]}/fulfill",
+            headers=external_auth,
+        )
+        assert resp.status_code == 200
+        assert get_count() == 2
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+from web.database import conn
+from web.database import model as m
+
+from bp_webhook.routes import intime
+
+
+class TestIntimeProductsAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def add_sku_numbers(self, client, add_skus):
+        with conn.begin() as s:
+            skus = s.query(m.Sku).order_by(m.Sku.id).all()
+            for i, sku in enumerate(skus[:4], start=1):
+                sku.number = f"SKU-{i}"
+            # Deleted skus are never listed
+            skus[3].is_deleted = True
+        return [x.id for x in skus[:3]]
+
+    @pytest.fixture(scope="function")
+    def get_count(self, client, external_auth):
+        def get_count():
+            resp = client.get(
+                "/webhook/v1/intime/products/count", headers=external_auth
+            )
+            assert resp.status_code == 200
+            return json.loads(resp.get_data(as_text=True))["count"]
+
+        return get_count
+
+    #
+    # Tests
+    #
+
+    def test_get_intime_products_list_streamed(
+        self, client, external_auth, add_sku_numbers, monkeypatch
+    ):
+        monkeypatch.setattr(intime, "STREAM_YIELD_PER", 2)
+        resp = client.get("/webhook/v1/intime/products/list", headers=external_auth)
+        assert resp.status_code == 200
+        assert resp.is_streamed
+
+        # Opening bracket, two chunks of skus and the closing bracket
+        chunks = [x.decode() for x in resp.response]
+        assert len(chunks) == 4
+        products = json.loads("".join(chunks))["products"]
+        assert [int(x["variantId"]) for x in products] == add_sku_numbers
+        assert [x["sku"] for x in products] == ["SKU-1", "SKU-2", "SKU-3"]
+
+    def test_get_intime_products_list_empty(self, client, external_auth, add_skus):
+        resp = client.get("/webhook/v1/intime/products/list", headers=external_auth)
+        assert resp.status_code == 200
+        assert json.loads(resp.get_data(as_text=True)) == {"products": []}
+
+    def test_post_intime_products_update_stock_success(
+        self, client, external_auth, add_sku_numbers
+    ):
+        products = [
+            {"sku": "SKU-1", "count": 5},
+            {"sku": "SKU-2", "count": 1},
+            {"sku": "SKU-4", "count": 5},
+            {"sku": "UNKNOWN", "count": 5},
+        ]
+        resp = client.post(
+            "/webhook/v1/intime/products/update-stock",
+            headers=external_auth,
+            json={"products": products},
+        )
+        assert resp.status_code == 200
+
+        # Unchanged stocks and deleted or unknown skus are not updated
+        assert json.loads(resp.get_data(as_text=True))["products"] == [
+            {"sku": "SKU-1", "isFound": True, "hasUpdated": True},
+            {"sku": "SKU-2", "isFound": True, "hasUpdated": False},
+            {"sku": "SKU-4", "isFound": False, "hasUpdated": False},
+            {"sku": "UNKNOWN", "isFound": False, "hasUpdated": False},
+        ]
+        with conn.begin() as s:
+            stocks = {x.number: x.stock for x in s.query(m.Sku) if x.number}
+        assert stocks == {"SKU-1": 5, "SKU-2": 1, "SKU-3": 1, "SKU-4": 1}
+
+    @pytest.mark.parametrize("count", [True, False, "5", None])
+    def test_post_intime_products_update_stock_invalid(
+        self, client, external_auth, add_sku_numbers, count
+    ):
+        resp = client.post(
+            "/webhook/v1/intime/products/update-stock",
+            headers=external_auth,
+            json={"products": [{"sku": "SKU-1", "count": count}]},
+        )
+        assert resp.status_code == 400
+
+    def test_get_intime_products_count_cached(
+        self, client, admin_auth, add_sku_numbers, get_count, monkeypatch
+    ):
+        assert get_count() == 3
+        assert get_count() == 3
+        resp = client.get("/webhook/v1/intime/counts/metrics", headers=admin_auth)
+        assert resp.status_code == 200
+        assert json.loads(resp.get_data(as_text=True))["hits"] >= 1
+
+        # Writes outside a session are only seen after the TTL
+        with conn.begin() as s:
+            s.connection().execute(
+                m.Sku.__table__.update()
+                .where(m.Sku.id == add_sku_numbers[0])
+                .values(number=None)
+            )
+        assert get_count() == 3
+        monkeypatch.setattr(intime.count_cache, "ttl_s", -1)
+        assert get_count() == 2
+
+    def test_get_intime_products_count_invalidated(
+        self, client, admin_auth, add_product, add_sku_numbers, get_count
+    ):
+        assert get_count() == 3
+
+        # A flushed change of a filtered column
+        resp = client.delete(f"/api/v1/skus/{add_sku_numbers[0]}", headers=admin_auth)
+        assert resp.status_code == 200
+        assert get_count() == 2
+
+        # A bulk update
+        resp = client.delete(f"/api/v1/products/{add_product.id}", headers=admin_auth)
+        assert resp.status_code == 200
+        assert get_count() == 0
+
+    def test_get_intime_products_count_rolled_back(self, add_sku_numbers, get_count):
+        assert get_count() == 3
+
+        # Counts are kept when the change is rolled back
+        with pytest.raises(RuntimeError), conn.begin() as s:
+            s.get(m.Sku, add_sku_numbers[0]).is_deleted = True
+            s.flush()
+            assert intime.count_keys.pending(s) == {"products"}
+            raise RuntimeError
+        assert intime.count_cache.get("products", lambda: -1) == 3
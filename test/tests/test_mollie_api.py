@@ -0,0 +1,113 @@
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from web.database import conn
+from web.database import model as m
+
+from bp_common import document
+from bp_webhook.models import MollieWebhook
+from bp_webhook.routes import mollie
+from bp_webhook.routes.mollie import mollie_queue
+
+
+class TestMollieAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def queue_enabled(self, patch_config, monkeypatch):
+        patch_config(MOLLIE_QUEUE_ENABLED=True)
+        # Drain the queue from the test instead of worker threads
+        monkeypatch.setattr(mollie_queue, "start", lambda app: None)
+
+    #
+    # Tests
+    #
+
+    def test_post_mollie_payment_queued(self, client, queue_enabled, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            mollie, "process_payment", lambda x: calls.append(x) or True
+        )
+        for _ in range(2):
+            resp = client.post("/webhook/v1/mollie/payment", data={"id": "tr_test"})
+            assert resp.status_code == 200
+
+        assert mollie_queue.drain() == 1
+        assert calls == ["tr_test"]
+        with conn.begin() as s:
+            assert s.query(MollieWebhook).count() == 0
+
+    def test_post_mollie_payment_queued_retry(self, client, queue_enabled, monkeypatch):
+        def process_payment(mollie_payment_id: str) -> bool:
+            raise RuntimeError
+
+        monkeypatch.setattr(mollie, "process_payment", process_payment)
+        resp = client.post("/webhook/v1/mollie/payment", data={"id": "tr_test"})
+        assert resp.status_code == 200
+
+        # The failed row is rescheduled with a backoff
+        assert mollie_queue.drain() == 1
+        with conn.begin() as s:
+            webhook = s.query(MollieWebhook).one()
+            assert webhook.attempts == 1
+        assert mollie_queue.drain() == 0
+
+    def test_post_mollie_payment_queued_attempts_reset(
+        self, client, queue_enabled, monkeypatch
+    ):
+        calls = []
+        monkeypatch.setattr(
+            mollie, "process_payment", lambda x: calls.append(x) or True
+        )
+        resp = client.post("/webhook/v1/mollie/payment", data={"id": "tr_test"})
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            s.query(MollieWebhook).update(
+                {MollieWebhook.attempts: mollie_queue.max_attempts}
+            )
+
+        # A new delivery is not dropped after the attempts of earlier ones
+        resp = client.post("/webhook/v1/mollie/payment", data={"id": "tr_test"})
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            assert s.query(MollieWebhook).one().attempts == 0
+        assert mollie_queue.drain() == 1
+        assert calls == ["tr_test"]
+
+    def test_post_mollie_payment_paid_prerenders_invoice(
+        self, client, add_orders, monkeypatch, tmp_path
+    ):
+        order_id = add_orders[0]
+        payment = SimpleNamespace(
+            metadata={"order_id": order_id},
+            is_paid=lambda: True,
+            expires_at=None,
+            paid_at=datetime.now(timezone.utc),
+            checkout_url="https://example.com/checkout",
+            locale="nl_NL",
+        )
+        payments = SimpleNamespace(get=lambda mollie_payment_id: payment)
+        monkeypatch.setattr(
+            mollie, "Mollie", lambda: SimpleNamespace(payments=payments)
+        )
+
+        # Render synchronously into an empty cache
+        pdf = SimpleNamespace(output=lambda path: open(path, "wb").close())
+        monkeypatch.setattr(document, "gen_invoice_pdf", lambda s, o, i: pdf)
+        monkeypatch.setattr(document.pdf_cache, "dir_", str(tmp_path))
+        monkeypatch.setattr(
+            document, "pdf_executor", SimpleNamespace(submit=lambda f: f())
+        )
+
+        resp = client.post("/webhook/v1/mollie/payment", data={"id": "tr_test"})
+        assert resp.status_code == 200
+
+        with conn.begin() as s:
+            order = s.get(m.Order, order_id)
+            assert order.status_id == m.OrderStatusId.PAID
+            etag = document.pdf_cache.gen_etag("invoice", order.invoice.id, "nl_NL")
+        assert os.listdir(tmp_path) == [f"{etag}.pdf"]
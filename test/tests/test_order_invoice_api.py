@@ -0,0 +1,108 @@
+import io
+import zipfile
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from web.database import conn
+from web.database import model as m
+
+from bp_api.routes import order_invoice
+from bp_common import document
+
+
+class TestOrderInvoiceAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def add_invoices(self, client, add_orders):
+        with conn.begin() as s:
+            invoices = [
+                m.Invoice(
+                    expires_at=None,
+                    paid_at=datetime.now(timezone.utc),
+                    order_id=order_id,
+                    payment_url="https://example.com/checkout",
+                )
+                for order_id in add_orders
+            ]
+            s.add_all(invoices)
+        return invoices
+
+    @pytest.fixture(scope="function")
+    def rendered(self, add_orders, monkeypatch, tmp_path):
+        # Render a PDF holding the order id, failing for the second order
+        rendered = []
+
+        def gen_invoice_pdf(s, order, invoice):
+            rendered.append(order.id)
+            if order.id == add_orders[1]:
+                raise RuntimeError("Rendering failed")
+
+            def output(path):
+                with open(path, "wb") as file:
+                    file.write(str(order.id).encode())
+
+            return SimpleNamespace(output=output)
+
+        monkeypatch.setattr(document, "gen_invoice_pdf", gen_invoice_pdf)
+        monkeypatch.setattr(document.pdf_cache, "dir_", str(tmp_path))
+        return rendered
+
+    #
+    # Tests
+    #
+
+    def test_get_orders_documents_zip_success(
+        self, client, admin_auth, add_orders, add_invoices, rendered
+    ):
+        today = date.today().isoformat()
+        resp = client.get(
+            f"/api/v1/orders/documents/zip?start_date={today}&end_date={today}",
+            headers=admin_auth,
+        )
+        assert resp.status_code == 200
+        assert resp.mimetype == "application/zip"
+
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as zip_:
+            names = zip_.namelist()
+            assert len(names) == 3
+            assert names[-1] == "errors.txt"
+            contents = {zip_.read(x).decode() for x in names[:-1]}
+            errors = zip_.read("errors.txt").decode().splitlines()
+        assert contents == {str(add_orders[0]), str(add_orders[2])}
+        assert len(errors) == 1
+        assert errors[0].startswith(f"render_invoice {add_invoices[1].id}: ")
+
+    def test_get_orders_documents_zip_bounded(
+        self, client, admin_auth, add_invoices, rendered, monkeypatch
+    ):
+        monkeypatch.setattr(order_invoice, "PDF_EXPORT_WORKERS", 1)
+        today = date.today().isoformat()
+        resp = client.get(
+            f"/api/v1/orders/documents/zip?start_date={today}&end_date={today}",
+            headers=admin_auth,
+            buffered=False,
+        )
+        assert resp.status_code == 200
+
+        # Only twice the number of workers is rendered ahead of the stream
+        chunks = resp.iter_encoded()
+        data = next(chunks)
+        assert len(rendered) <= 2
+        data += b"".join(chunks)
+        resp.close()
+        assert len(rendered) == 3
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zip_:
+            assert len(zip_.namelist()) == 3
+
+    @pytest.mark.parametrize(
+        "query",
+        ["", "start_date=2024-01-02&end_date=2024-01-01", "start_date=x&end_date=y"],
+    )
+    def test_get_orders_documents_zip_invalid(self, client, admin_auth, query):
+        resp = client.get(f"/api/v1/orders/documents/zip?{query}", headers=admin_auth)
+        assert resp.status_code == 400
@@ -0,0 +1,153 @@
+import io
+
+import pytest
+from web.api.utils.sku import get_sku_unit_price
+from web.database import conn
+from web.database.model import File, Product, ProductMedia, ProductValue, Sku
+
+from bp_api import media
+from bp_api.media import cdn_delete_queue
+from bp_api.models import CdnDeletion
+
+
+class TestProductAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def add_media(self, client, admin_auth, patch_config, add_product, monkeypatch):
+        patch_config(CDN_IMAGE_SIZES=[])
+        monkeypatch.setattr(media.cdn, "upload", lambda file, path: None)
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/media",
+            headers=admin_auth,
+            data={"file": [(io.BytesIO(b"image"), "image.jpg")]},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+        return resp.json["data"][0]["path"]
+
+    #
+    # Tests
+    #
+
+    def test_delete_products_id_success(
+        self, client, admin_auth, add_product, add_skus, add_media
+    ):
+        resp = client.delete(f"/api/v1/products/{add_product.id}", headers=admin_auth)
+        assert resp.status_code == 200
+        assert resp.json["data"]["skus_count"] == 5
+
+        # Media are kept until they are purged
+        with conn.begin() as s:
+            assert s.query(ProductMedia).count() == 1
+            assert s.query(CdnDeletion).count() == 0
+
+    def test_post_cdn_purge_success(
+        self, client, admin_auth, add_product, add_media, monkeypatch
+    ):
+        deleted_paths = []
+        monkeypatch.setattr(
+            media.cdn, "delete", lambda path: deleted_paths.append(path)
+        )
+        resp = client.delete(f"/api/v1/products/{add_product.id}", headers=admin_auth)
+        assert resp.status_code == 200
+
+        # Without workers the files are deleted inline
+        resp = client.post("/api/v1/cdn/purge", headers=admin_auth)
+        assert resp.status_code == 200
+        assert resp.json["data"] == {"media_count": 1}
+        assert deleted_paths == [add_media]
+        with conn.begin() as s:
+            assert s.query(ProductMedia).count() == 0
+            assert s.query(File).count() == 0
+            assert s.query(CdnDeletion).count() == 0
+
+    def test_post_cdn_purge_queued(
+        self, client, admin_auth, patch_config, add_product, add_media, monkeypatch
+    ):
+        patch_config(CDN_DELETE_QUEUE_ENABLED=True)
+        # Drain the queue from the test instead of worker threads
+        monkeypatch.setattr(cdn_delete_queue, "start", lambda app: None)
+        resp = client.delete(f"/api/v1/products/{add_product.id}", headers=admin_auth)
+        assert resp.status_code == 200
+
+        resp = client.post("/api/v1/cdn/purge", headers=admin_auth)
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            assert [x.path for x in s.query(CdnDeletion)] == [add_media]
+
+        deleted_paths = []
+        monkeypatch.setattr(
+            media.cdn, "delete", lambda path: deleted_paths.append(path)
+        )
+        with client.application.app_context():
+            assert cdn_delete_queue.drain() == 1
+        assert deleted_paths == [add_media]
+        with conn.begin() as s:
+            assert s.query(CdnDeletion).count() == 0
+
+    def test_post_cdn_reconcile_success(
+        self, client, admin_auth, add_product, add_media, monkeypatch
+    ):
+        deleted_paths = []
+        monkeypatch.setattr(
+            media.cdn, "delete", lambda path: deleted_paths.append(path)
+        )
+        monkeypatch.setattr(
+            media,
+            "list_cdn_paths",
+            lambda folders, grace_s: [add_media, "product/x.jpg"],
+        )
+        resp = client.delete(f"/api/v1/products/{add_product.id}", headers=admin_auth)
+        assert resp.status_code == 200
+
+        # Media of deleted products are only removed by a purge
+        resp = client.post("/api/v1/cdn/reconcile", headers=admin_auth)
+        assert resp.status_code == 200
+        assert resp.json["data"] == {"orphans_count": 1}
+        assert deleted_paths == ["product/x.jpg"]
+        with conn.begin() as s:
+            assert s.query(ProductMedia).count() == 1
+
+    def test_patch_products_prices_success(
+        self, client, admin_auth, add_product, add_product_values
+    ):
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/skus", headers=admin_auth
+        )
+        assert resp.status_code == 200
+
+        data = {
+            "products": [{"id": add_product.id, "unit_price": 20}],
+            "values": [{"id": add_product_values[1].id, "unit_price": 2.5}],
+        }
+        resp = client.patch("/api/v1/products/prices", headers=admin_auth, json=data)
+        assert resp.status_code == 200
+        assert resp.json["data"]["skus_count"] == 4
+
+        # The bulk price matches the price of a single SKU
+        with conn.begin() as s:
+            product = s.query(Product).filter_by(id=add_product.id).one()
+            for sku in s.query(Sku).all():
+                values = (
+                    s.query(ProductValue)
+                    .filter(ProductValue.id.in_(sku.value_ids))
+                    .order_by(ProductValue.id)
+                    .all()
+                )
+                assert sku.unit_price == get_sku_unit_price(product, values)
+
+    @pytest.mark.parametrize("unit_price", [None, "20", True, "NaN"])
+    def test_patch_products_prices_invalid(
+        self, client, admin_auth, add_product, unit_price
+    ):
+        data = {"products": [{"id": add_product.id, "unit_price": unit_price}]}
+        resp = client.patch("/api/v1/products/prices", headers=admin_auth, json=data)
+        assert resp.status_code == 400
+
+    def test_patch_products_prices_missing(self, client, admin_auth, add_product):
+        data = {"products": [{"id": add_product.id}]}
+        resp = client.patch("/api/v1/products/prices", headers=admin_auth, json=data)
+        assert resp.status_code == 400
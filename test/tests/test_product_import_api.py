@@ -0,0 +1,77 @@
+import json
+
+import pytest
+from web.database import conn
+from web.database.model import Product, Sku
+
+from bp_api.routes.product_import import Text
+
+
+class TestProductImportAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def post_import(self, client, admin_auth):
+        def post_import(rows):
+            resp = client.post(
+                "/api/v1/products/import",
+                headers=admin_auth,
+                data="\n".join(json.dumps(x) for x in rows),
+                content_type="application/x-ndjson",
+            )
+            assert resp.status_code == 200
+            lines = resp.get_data(as_text=True).splitlines()
+            return [json.loads(x) for x in lines]
+
+        return post_import
+
+    #
+    # Tests
+    #
+
+    def test_post_products_import_success(self, post_import):
+        rows = [
+            {"product": "Shirt", "option": "Color", "value": "Red"},
+            {"product": "Shirt", "option": "Color", "value": "Blue"},
+            {"product": "Shirt", "option": "Size", "value": "Large"},
+        ]
+        lines = post_import(rows)
+        assert lines[-1] == {"rows_count": 3, "errors_count": 0}
+
+        with conn.begin() as s:
+            slugs = {x.slug for x in s.query(Sku)}
+        assert slugs == {"shirt-red-large", "shirt-blue-large"}
+
+    def test_post_products_import_invalid_link_type(self, post_import):
+        rows = [
+            {"product": "Shirt"},
+            {"product": "Shirt", "link_type": "invalid", "link_sku": "shirt"},
+        ]
+        lines = post_import(rows)
+        assert lines[0]["errors"] == [
+            {"line": 2, "error": Text.COLUMN_INVALID, "column": "link_type"}
+        ]
+        assert lines[-1] == {"rows_count": 2, "errors_count": 1}
+
+    def test_post_products_import_deleted_product(
+        self, client, admin_auth, post_import, add_product
+    ):
+        resp = client.delete(f"/api/v1/products/{add_product.id}", headers=admin_auth)
+        assert resp.status_code == 200
+
+        # Deleted products are not restored, like in post_products
+        rows = [
+            {"product": add_product.name, "product_unit_price": 20},
+            {"product": "Shirt"},
+        ]
+        lines = post_import(rows)
+        assert lines[0]["errors"] == [{"line": 1, "error": Text.PRODUCT_DELETED}]
+        assert lines[-1] == {"rows_count": 2, "errors_count": 1}
+
+        with conn.begin() as s:
+            product = s.get(Product, add_product.id)
+            assert product.is_deleted
+            assert product.unit_price == 10
+            assert s.query(Product).filter_by(is_deleted=False).count() == 1
@@ -0,0 +1,125 @@
+import io
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from bp_api import media
+
+
+class TestProductMediaAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def uploaded_paths(self, monkeypatch):
+        paths = []
+        monkeypatch.setattr(media.cdn, "upload", lambda file, path: paths.append(path))
+        return paths
+
+    @pytest.fixture(scope="function")
+    def image_data(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (1000, 500)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    #
+    # Tests
+    #
+
+    def test_post_products_id_media_success(
+        self, client, admin_auth, patch_config, add_product, uploaded_paths
+    ):
+        patch_config(CDN_IMAGE_SIZES=[])
+        files = [
+            (io.BytesIO(b"first"), "first.jpg"),
+            (io.BytesIO(b"second"), "second.png"),
+            (io.BytesIO(b"third"), "third.txt"),
+        ]
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/media",
+            headers=admin_auth,
+            data={"file": files},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+
+        data = resp.json["data"]
+        assert [x["is_uploaded"] for x in data] == [True, True, False]
+        assert data[2]["error"] == media.Text.EXTENSION_UNSUPPORTED
+        assert sorted(uploaded_paths) == sorted(x["path"] for x in data[:2])
+
+        get_resp = client.get(f"/api/v1/products/{add_product.id}/media")
+        assert get_resp.status_code == 200
+        assert len(get_resp.json["data"]) == 2
+
+    @pytest.mark.parametrize("auto_naming", [True, False])
+    def test_post_products_id_media_unique_paths(
+        self, client, admin_auth, patch_config, add_product, uploaded_paths, auto_naming
+    ):
+        # Uploads read the same sequence when they run concurrently
+        patch_config(CDN_IMAGE_SIZES=[], CDN_AUTO_NAMING=auto_naming)
+        uploads = [
+            media.gen_media_uploads(
+                [FileStorage(io.BytesIO(b"image"), "image.jpg")], "product", "slug", 1
+            )[0]
+            for _ in range(2)
+        ]
+        assert uploads[0].path != uploads[1].path
+
+        for _ in range(2):
+            resp = client.post(
+                f"/api/v1/products/{add_product.id}/media",
+                headers=admin_auth,
+                data={"file": [(io.BytesIO(b"image"), "image.jpg")]},
+                content_type="multipart/form-data",
+            )
+            assert resp.status_code == 200
+        assert len(set(uploaded_paths)) == 2
+
+    def test_post_products_id_media_upload_failed(
+        self, client, admin_auth, patch_config, add_product, monkeypatch
+    ):
+        patch_config(CDN_IMAGE_SIZES=[])
+
+        def upload(file, path):
+            raise ConnectionError("Connection refused")
+
+        monkeypatch.setattr(media.cdn, "upload", upload)
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/media",
+            headers=admin_auth,
+            data={"file": [(io.BytesIO(b"image"), "image.jpg")]},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+        assert resp.json["data"][0]["error"] == media.Text.UPLOAD_FAILED
+
+        get_resp = client.get(f"/api/v1/products/{add_product.id}/media")
+        assert get_resp.status_code == 200
+        assert get_resp.json["data"] == []
+
+    def test_post_products_id_media_derivatives(
+        self, client, admin_auth, patch_config, add_product, uploaded_paths, image_data
+    ):
+        patch_config(CDN_IMAGE_SIZES=[480, 2000], CDN_IMAGE_FORMATS=["webp"])
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/media",
+            headers=admin_auth,
+            data={"file": [(io.BytesIO(image_data), "image.png")]},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200
+
+        # Images are never upscaled
+        path = resp.json["data"][0]["path"]
+        assert media.gen_derivative_path(path, 480, "webp") in uploaded_paths
+        assert media.gen_derivative_path(path, 1000, "webp") in uploaded_paths
+        assert len(uploaded_paths) == 3
+
+        get_resp = client.get(f"/api/v1/products/{add_product.id}/media")
+        assert get_resp.status_code == 200
+        srcset = get_resp.json["data"][0]["srcset"]
+        assert list(srcset) == ["webp"]
+        assert "480w" in srcset["webp"] and "1000w" in srcset["webp"]
@@ -0,0 +1,37 @@
+from web.database import conn
+from web.database.model import ProductValue, Sku
+
+
+class TestProductOptionAPI:
+    #
+    # Tests
+    #
+
+    def test_delete_products_id_options_id_cascade(
+        self, client, admin_auth, add_product, add_product_values
+    ):
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/skus", headers=admin_auth
+        )
+        assert resp.status_code == 200
+
+        option_id = add_product_values[0].option_id
+        resp = client.delete(
+            f"/api/v1/products/{add_product.id}/options/{option_id}",
+            headers=admin_auth,
+        )
+        assert resp.status_code == 200
+        assert resp.json["data"] == {"values_count": 2, "skus_count": 4}
+
+        with conn.begin() as s:
+            assert s.query(ProductValue).filter_by(is_deleted=False).count() == 2
+            assert s.query(Sku).filter_by(is_deleted=False).count() == 0
+
+    def test_delete_products_id_options_id_not_found(
+        self, client, admin_auth, add_product, INVALID_ID
+    ):
+        resp = client.delete(
+            f"/api/v1/products/{add_product.id}/options/{INVALID_ID}",
+            headers=admin_auth,
+        )
+        assert resp.status_code == 404
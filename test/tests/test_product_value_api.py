@@ -0,0 +1,35 @@
+from web.database import conn
+from web.database.model import Sku
+
+
+class TestProductValueAPI:
+    #
+    # Tests
+    #
+
+    def test_delete_products_id_values_id_cascade(
+        self, client, admin_auth, add_product, add_product_values
+    ):
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/skus", headers=admin_auth
+        )
+        assert resp.status_code == 200
+
+        value_id = add_product_values[0].id
+        resp = client.delete(
+            f"/api/v1/products/{add_product.id}/values/{value_id}",
+            headers=admin_auth,
+        )
+        assert resp.status_code == 200
+        assert resp.json["data"] == {"skus_count": 2}
+
+        # Deleted SKUs are not counted again
+        resp = client.delete(
+            f"/api/v1/products/{add_product.id}/values/{value_id}",
+            headers=admin_auth,
+        )
+        assert resp.status_code == 200
+        assert resp.json["data"] == {"skus_count": 0}
+
+        with conn.begin() as s:
+            assert s.query(Sku).filter_by(is_deleted=False).count() == 2
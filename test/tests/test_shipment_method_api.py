@@ -0,0 +1,156 @@
+import pytest
+from sqlalchemy import false, or_
+from web.database import conn
+from web.database import model as m
+
+from bp_api.routes.shipment_method import shipment_index
+
+
+class TestShipmentMethodAPI:
+    #
+    # Fixtures
+    #
+
+    @pytest.fixture(scope="function")
+    def add_shipment_methods(self, client, add_country_nl, add_product):
+        with conn.begin() as s:
+            classes = [
+                m.ShipmentClass(name="Parcel", order=2),
+                m.ShipmentClass(name="Letter", order=1),
+            ]
+            zones = [
+                m.ShipmentZone(region_id=add_country_nl.region_id, order=2),
+                m.ShipmentZone(country_id=add_country_nl.id, order=1),
+            ]
+            s.add_all([*classes, *zones])
+            s.flush()
+            methods = [
+                m.ShipmentMethod(
+                    name=f"Method {i}",
+                    class_id=class_.id,
+                    zone_id=zone.id,
+                    unit_price=unit_price,
+                )
+                for i, (class_, zone, unit_price) in enumerate(
+                    [
+                        (classes[1], zones[1], 5),
+                        (classes[1], zones[1], 3),
+                        (classes[1], zones[0], 1),
+                        (classes[0], zones[1], 2),
+                    ]
+                )
+            ]
+            s.add_all(methods)
+            product = s.get(m.Product, add_product.id)
+            product.shipment_class_id = classes[1].id
+        return methods
+
+    @pytest.fixture(scope="function")
+    def cart_id(
+        self, client, user_auth, add_country_nl, add_skus, add_shipment_methods
+    ):
+        shipping_data = {
+            "address": "123 Test Street",
+            "city": "Amsterdam",
+            "country_id": add_country_nl.id,
+            "email": "test@example.com",
+            "first_name": "John",
+            "last_name": "Doe",
+            "zip_code": "1012AB",
+        }
+        resp = client.post("/api/v1/shippings", headers=user_auth, json=shipping_data)
+        assert resp.status_code == 200
+        shipping_id = resp.json["data"]["id"]
+
+        resp = client.post("/api/v1/carts", headers=user_auth, json={})
+        assert resp.status_code == 200
+        cart_id = resp.json["data"]["id"]
+        resp = client.post(
+            f"/api/v1/carts/{cart_id}/items",
+            headers=user_auth,
+            json={"sku_id": add_skus[0].id, "quantity": 1},
+        )
+        assert resp.status_code == 200
+        resp = client.patch(
+            f"/api/v1/carts/{cart_id}",
+            headers=user_auth,
+            json={"shipping_id": shipping_id},
+        )
+        assert resp.status_code == 200
+        return cart_id
+
+    @pytest.fixture(scope="function")
+    def get_method_ids(self, client, user_auth, cart_id):
+        def get_method_ids():
+            resp = client.get(
+                f"/api/v1/shipment-methods?cart_id={cart_id}", headers=user_auth
+            )
+            assert resp.status_code == 200
+            return [x["id"] for x in resp.json["data"]]
+
+        return get_method_ids
+
+    #
+    # Tests
+    #
+
+    def test_get_shipment_methods_success(
+        self, add_country_nl, add_product, get_method_ids
+    ):
+        # Resolve the methods like the queries the index replaced
+        with conn.begin() as s:
+            product = s.get(m.Product, add_product.id)
+            shipment_class = (
+                s.query(m.ShipmentClass)
+                .filter(
+                    m.ShipmentClass.id.in_([product.shipment_class_id]),
+                    m.ShipmentClass.is_deleted == false(),
+                )
+                .order_by(m.ShipmentClass.order)
+                .first()
+            )
+            shipment_zone = (
+                s.query(m.ShipmentZone)
+                .filter(
+                    or_(
+                        m.ShipmentZone.country_id == add_country_nl.id,
+                        m.ShipmentZone.region_id == add_country_nl.region_id,
+                    ),
+                    m.ShipmentZone.is_deleted == false(),
+                )
+                .order_by(m.ShipmentZone.order)
+                .first()
+            )
+            expected_ids = [
+                x.id
+                for x in s.query(m.ShipmentMethod)
+                .filter_by(
+                    class_id=shipment_class.id,
+                    zone_id=shipment_zone.id,
+                    is_deleted=False,
+                )
+                .order_by(m.ShipmentMethod.unit_price)
+            ]
+
+        assert len(expected_ids) == 2
+        assert get_method_ids() == expected_ids
+
+    def test_get_shipment_methods_invalidated(self, client, admin_auth, get_method_ids):
+        method_ids = get_method_ids()
+        resp = client.delete(
+            f"/api/v1/shipment-methods/{method_ids[0]}", headers=admin_auth
+        )
+        assert resp.status_code == 200
+
+        assert get_method_ids() == method_ids[1:]
+
+    def test_get_shipment_methods_expired(self, get_method_ids, monkeypatch):
+        method_ids = get_method_ids()
+
+        # Writes that bypass the admin endpoints are only seen after the TTL
+        with conn.begin() as s:
+            s.get(m.ShipmentMethod, method_ids[0]).is_deleted = True
+        assert get_method_ids() == method_ids
+
+        monkeypatch.setattr(shipment_index, "ttl_s", -1)
+        assert get_method_ids() == method_ids[1:]
@@ -0,0 +1,117 @@
+import pytest
+from web.database import conn
+from web.database.model import Sku
+
+from bp_api.models import SkuName
+
+
+class TestSkuAPI:
+    #
+    # Tests
+    #
+
+    def test_patch_skus_success(self, client, admin_auth, add_skus):
+        data = {"skus": [{"id": x.id, "stock": 5} for x in add_skus]}
+        resp = client.patch("/api/v1/skus", headers=admin_auth, json=data)
+        assert resp.status_code == 200
+        assert [x["id"] for x in resp.json["data"]] == [x.id for x in add_skus]
+
+        get_resp = client.get(
+            "/api/v1/skus?fields=stock,updated_at", headers=admin_auth
+        )
+        assert get_resp.status_code == 200
+        assert {x["stock"] for x in get_resp.json["data"]} == {5}
+        assert all(x["updated_at"] for x in get_resp.json["data"])
+
+    def test_patch_skus_conflict(self, client, admin_auth, add_skus):
+        sku_id, other_sku_id = add_skus[0].id, add_skus[1].id
+        data = {"skus": [{"id": sku_id, "stock": 2}]}
+        resp = client.patch("/api/v1/skus", headers=admin_auth, json=data)
+        assert resp.status_code == 200
+        stale_updated_at = resp.json["data"][0]["updated_at"]
+
+        data = {"skus": [{"id": sku_id, "updated_at": stale_updated_at, "stock": 3}]}
+        resp = client.patch("/api/v1/skus", headers=admin_auth, json=data)
+        assert resp.status_code == 200
+
+        # A stale item rolls back the whole batch
+        data = {
+            "skus": [
+                {"id": sku_id, "updated_at": stale_updated_at, "stock": 4},
+                {"id": other_sku_id, "stock": 4},
+            ]
+        }
+        resp = client.patch("/api/v1/skus", headers=admin_auth, json=data)
+        assert resp.status_code == 409
+        assert resp.json["data"] == {"ids": [sku_id]}
+
+        with conn.begin() as s:
+            assert s.query(Sku).filter_by(id=sku_id).one().stock == 3
+            assert s.query(Sku).filter_by(id=other_sku_id).one().stock == 1
+
+    @pytest.mark.parametrize(
+        "item", [{"stock": True}, {"stock": False}, {"is_visible": 1}]
+    )
+    def test_patch_skus_invalid(self, client, admin_auth, add_skus, item):
+        data = {"skus": [{"id": add_skus[0].id, **item}]}
+        resp = client.patch("/api/v1/skus", headers=admin_auth, json=data)
+        assert resp.status_code == 400
+
+        with conn.begin() as s:
+            sku = s.query(Sku).filter_by(id=add_skus[0].id).one()
+            assert sku.stock == 1
+            assert sku.is_visible
+
+    def test_get_skus_unpaginated(self, client, admin_auth, add_skus):
+        resp = client.get("/api/v1/skus", headers=admin_auth)
+        assert resp.status_code == 200
+        assert len(resp.json["data"]) == 5
+
+        resp = client.get("/api/v1/skus?limit=2", headers=admin_auth)
+        assert resp.status_code == 200
+        assert [x["slug"] for x in resp.json["data"]] == [
+            "test-product-1",
+            "test-product-2",
+        ]
+
+        resp = client.get("/api/v1/skus?after=test-product-4", headers=admin_auth)
+        assert resp.status_code == 200
+        assert [x["slug"] for x in resp.json["data"]] == ["test-product-5"]
+
+    def test_get_skus_names_cleared(self, client, admin_auth, add_product, add_skus):
+        resp = client.get("/api/v1/skus?fields=name", headers=admin_auth)
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            assert s.query(SkuName).count() == 5
+
+        # Regenerating the skus of a product clears their names
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/skus", headers=admin_auth
+        )
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            assert s.query(SkuName).count() == 0
+
+    @pytest.mark.parametrize("path", ["values/{value_id}", "options/{option_id}", ""])
+    def test_delete_products_names_cleared(
+        self, client, admin_auth, add_product, add_product_values, path
+    ):
+        resp = client.post(
+            f"/api/v1/products/{add_product.id}/skus", headers=admin_auth
+        )
+        assert resp.status_code == 200
+        resp = client.get("/api/v1/skus?fields=name", headers=admin_auth)
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            assert s.query(SkuName).count() == 4
+
+        # Deleting values, options or products clears the names of their skus
+        value = add_product_values[0]
+        path = path.format(value_id=value.id, option_id=value.option_id)
+        resp = client.delete(
+            f"/api/v1/products/{add_product.id}/{path}".rstrip("/"),
+            headers=admin_auth,
+        )
+        assert resp.status_code == 200
+        with conn.begin() as s:
+            assert s.query(SkuName).count() == 0